@@ -0,0 +1,212 @@
+"""Benchmark the solvers on a standard corpus of exact cover problems
+
+Every problem is solved by every available backend, each run in a fresh
+process so its peak memory is its own.  The results are printed as a table
+and written as JSON for comparing releases:
+
+    python benchmark.py [--output results.json] [--problem name]... [--backend name]...
+
+The subprocess solvers only report nodes and time, so their updates are
+left out.
+"""
+
+import json
+import numpy as np
+import platform
+import re
+import subprocess
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import dance
+import dance_backends
+import pentomino
+import sudoko
+
+def n_queens(n):
+    """Queens on an n x n board, one per row and column
+
+    The diagonals must be covered at most once, which the subprocess
+    solvers cannot express, so every diagonal also has a row covering only
+    it.  Those rows complete each placement in exactly one way.
+    """
+    n_diagonals = 2 * n - 1
+    rows = [[r, n + c, 2*n + r + c, 2*n + n_diagonals + r - c + n - 1]
+            for r in range(n) for c in range(n)]
+    rows += [[d] for d in range(2*n, 2*n + 2*n_diagonals)]
+    return dance.SparseMatrix.from_rows(rows, 2*n + 2*n_diagonals)
+
+def langford(n):
+    """Langford pairs: the two copies of k are placed k + 1 apart in 2n slots
+
+    Both a sequence and its reverse are counted.
+    """
+    rows = [[k - 1, n + i, n + i + k + 1]
+            for k in range(1, n + 1) for i in range(2*n - k - 1)]
+    return dance.SparseMatrix.from_rows(rows, 3*n)
+
+def sudoku(board):
+    return sudoko.exact_cover_problem(np.asarray(board), sparse=True)
+
+def hard_sudoku():
+    clues = ('800000000003600000070090200050007000000045700'
+             '000100030001000068008500010090000400')
+    return sudoku(np.array([int(c) for c in clues]).reshape(9, 9))
+
+def random_sudoku(K, seed):
+    """A solved K x K board with about half the squares emptied"""
+    solution = dance.DancingLinks(sudoko.full_exact_cover_problem(K, sparse=True)).solve(1)[0]
+    board = sudoko.board_for_solution(solution, K)
+    board[np.random.RandomState(seed).rand(K, K) < 0.55] = 0
+    return sudoku(board)
+
+def pentominoes(board):
+    return pentomino.exact_cover_problem(board, sparse=True)
+
+# Name: (problem, solution limit)
+corpus = {
+    'hollow_chess_board': (lambda: pentominoes(pentomino.boards['hollow_chess_board']), None),
+    'pentomino_6x10': (lambda: pentominoes(np.ones((6, 10), dtype=bool)), 100),
+    'sudoku_9x9': (hard_sudoku, 2),
+    'sudoku_16x16': (lambda: random_sudoku(16, 16), 2),
+    'queens_10': (lambda: n_queens(10), None),
+    'langford_8': (lambda: langford(8), None),
+}
+
+engines = {
+    'python': dance.DancingLinks,
+    'python-array': dance.ArrayDancingLinks,
+}
+
+def backend_names():
+    """The Python engines and the subprocess solvers that are installed"""
+    subprocesses = [b.name for b in dance_backends.available_backends()
+                    if isinstance(b, dance_backends.SubprocessBackend)]
+    return list(engines) + subprocesses
+
+def peak_rss():
+    """Peak resident memory of this process in kB
+
+    ru_maxrss carries over the peak of the parent a process was started
+    from, so the high water mark of /proc/self/status is used where there
+    is one.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return float(line.split()[1])
+    except (IOError, OSError):
+        pass
+
+    if resource is None:
+        return None
+    scale = 1024.0 if sys.platform == 'darwin' else 1.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def rate(count, seconds):
+    if count is None or not seconds:
+        return None
+    return count / seconds
+
+def run(problem_name, backend_name):
+    """Solve one problem with one backend, in this process"""
+    build_problem, limit = corpus[problem_name]
+
+    start = dance.clock()
+    problem = build_problem()
+    generate_time = dance.clock() - start
+
+    result = {'problem': problem_name,
+              'backend': backend_name,
+              'limit': limit,
+              'rows': problem.shape[0],
+              'columns': problem.shape[1],
+              'elements': problem.nnz,
+              'generate_time': generate_time}
+
+    if backend_name in engines:
+        start = dance.clock()
+        dl = engines[backend_name](problem)
+        build_time = dance.clock() - start
+
+        solutions, stats = dl.solve_with_stats(limit)
+        nodes, updates, solve_time = stats.nodes, stats.updates, stats.wall_time
+        rss = peak_rss()
+    else:
+        # The solver builds the structure itself and only reports totals
+        solutions, err = dance_backends.get_backend(backend_name).run(problem, limit)
+        nodes = int(re.search(r'Nodes searched: (\d+)', err).group(1))
+        solve_time = float(re.search(r'Time elapsed: ([\d.e+-]+)', err).group(1))
+        build_time = updates = None
+        rss = re.search(r'Peak RSS: (\d+) kB', err)
+        rss = float(rss.group(1)) if rss else None
+
+    result.update({'build_time': build_time,
+                   'solve_time': solve_time,
+                   'solutions': len(solutions),
+                   'nodes': nodes,
+                   'updates': updates,
+                   'nodes_per_sec': rate(nodes, solve_time),
+                   'updates_per_sec': rate(updates, solve_time),
+                   'peak_rss_kb': rss})
+    return result
+
+def run_in_subprocess(problem_name, backend_name):
+    args = [sys.executable, __file__, '--single', problem_name, backend_name]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        return {'problem': problem_name, 'backend': backend_name,
+                'error': err.decode().strip().splitlines()[-1]}
+    return json.loads(out.decode())
+
+def format_value(value, fmt):
+    return '-' if value is None else fmt % value
+
+def print_table(results):
+    print('%-20s %-12s %10s %10s %12s %12s %14s %10s' %
+          ('problem', 'backend', 'solutions', 'build s', 'solve s', 'nodes/s',
+           'updates/s', 'rss kB'))
+    for r in results:
+        if 'error' in r:
+            print('%-20s %-12s failed: %s' % (r['problem'], r['backend'], r['error']))
+            continue
+        print('%-20s %-12s %10d %10s %12.4f %12s %14s %10s' %
+              (r['problem'], r['backend'], r['solutions'],
+               format_value(r['build_time'], '%.4f'), r['solve_time'],
+               format_value(r['nodes_per_sec'], '%.0f'),
+               format_value(r['updates_per_sec'], '%.0f'),
+               format_value(r['peak_rss_kb'], '%.0f')))
+
+def options(args, name):
+    """Values of every --name option"""
+    return [args[i + 1] for i, a in enumerate(args[:-1]) if a == '--' + name]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+
+    if args[:1] == ['--single']:
+        json.dump(run(args[1], args[2]), sys.stdout)
+        sys.exit(0)
+
+    problems = options(args, 'problem') or sorted(corpus)
+    backends = options(args, 'backend') or backend_names()
+    output = (options(args, 'output') or ['benchmark.json'])[0]
+
+    results = []
+    for problem_name in problems:
+        for backend_name in backends:
+            results.append(run_in_subprocess(problem_name, backend_name))
+
+    print_table(results)
+
+    with open(output, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'results': results}, f, indent=2)
+    print('\nResults written to %s' % output)
@@ -1,6 +1,8 @@
 package main
 
 import (
+	"bytes"
+	"encoding/binary"
 	"fmt"
 	"io/ioutil"
 	"math"
@@ -23,6 +25,7 @@ type DancingLinks struct {
 	solution                    []int
 	all_solutions               [][]int
 	nodes_searched              int
+	limit                       int
 }
 
 func SingletonNode() *Node {
@@ -37,7 +40,7 @@ func SingletonNode() *Node {
 func BuildDancingLinks(matrix [][]bool) *DancingLinks {
 	n_columns := len(matrix[0])
 
-	dl := &DancingLinks{}
+	dl := &DancingLinks{limit: -1}
 	dl.head = SingletonNode()
 	dl.BuildEmptyColumns(n_columns)
 	for i, row := range matrix {
@@ -46,6 +49,17 @@ func BuildDancingLinks(matrix [][]bool) *DancingLinks {
 	return dl
 }
 
+// Build from the column indices of each row, as stored in binary problems
+func BuildDancingLinksFromRows(rows [][]int, n_columns int) *DancingLinks {
+	dl := &DancingLinks{limit: -1}
+	dl.head = SingletonNode()
+	dl.BuildEmptyColumns(n_columns)
+	for i, columns := range rows {
+		dl.InsertColumns(columns, i)
+	}
+	return dl
+}
+
 func (dl *DancingLinks) BuildEmptyColumns(n_columns int) {
 	dl.columns = make([]*Node, n_columns)
 
@@ -106,6 +120,28 @@ func (dl *DancingLinks) InsertRow(row []bool, key int) {
 	}
 }
 
+func (dl *DancingLinks) InsertColumns(columns []int, key int) {
+	var current, first *Node
+
+	for _, c := range columns {
+		node := dl.InsertSingleElement(dl.columns[c], key)
+
+		if current != nil {
+			current.right = node
+			node.left = current
+		} else {
+			first = node
+		}
+
+		current = node
+	}
+
+	if current != nil {
+		current.right = first
+		first.left = current
+	}
+}
+
 func (dl *DancingLinks) Cover(column *Node) {
 	column.right.left = column.left
 	column.left.right = column.right
@@ -170,31 +206,92 @@ func (dl *DancingLinks) Search() {
 			dl.Uncover(j.column)
 		}
 		dl.solution = dl.solution[:len(dl.solution)-1]
+
+		if dl.LimitReached() {
+			break
+		}
 	}
 	dl.Uncover(c)
 }
 
+// The search stops early once limit solutions are found, -1 means no limit
+func (dl *DancingLinks) LimitReached() bool {
+	return dl.limit >= 0 && len(dl.all_solutions) >= dl.limit
+}
+
 func (dl *DancingLinks) AllSolutions() [][]int {
 	dl.solution = make([]int, 0)
 	dl.all_solutions = make([][]int, 0)
 	dl.nodes_searched = 0
 
 	start := time.Now()
-	dl.Search()
+	if !dl.LimitReached() {
+		dl.Search()
+	}
 	elapsed := time.Since(start).Seconds()
 
-	fmt.Printf("Nodes searched: %d\n", dl.nodes_searched)
-	fmt.Printf("Solutions found: %d\n", len(dl.all_solutions))
-	fmt.Printf("Time elapsed: %f\n", elapsed)
+	fmt.Fprintf(os.Stderr, "Nodes searched: %d\n", dl.nodes_searched)
+	fmt.Fprintf(os.Stderr, "Solutions found: %d\n", len(dl.all_solutions))
+	fmt.Fprintf(os.Stderr, "Time elapsed: %f\n", elapsed)
+	if rss := PeakRSS(); rss >= 0 {
+		fmt.Fprintf(os.Stderr, "Peak RSS: %d kB\n", rss)
+	}
 	return dl.all_solutions
 }
 
-func LoadProblem(filename string) [][]bool {
-	data, err := ioutil.ReadFile(filename)
+// Peak resident memory in kB from /proc/self/status, -1 if unavailable
+func PeakRSS() int {
+	data, err := ioutil.ReadFile("/proc/self/status")
+	if err != nil {
+		return -1
+	}
+
+	for _, line := range strings.Split(string(data), "\n") {
+		fields := strings.Fields(line)
+		if len(fields) >= 2 && fields[0] == "VmHWM:" {
+			if kb, err := strconv.Atoi(fields[1]); err == nil {
+				return kb
+			}
+		}
+	}
+	return -1
+}
+
+// Read a whole input file, "-" reads standard input
+func ReadInput(filename string) []byte {
+	var data []byte
+	var err error
+
+	if filename == "-" {
+		data, err = ioutil.ReadAll(os.Stdin)
+	} else {
+		data, err = ioutil.ReadFile(filename)
+	}
 	if err != nil {
 		panic(err)
 	}
+	return data
+}
+
+// Write a whole output file, "-" writes standard output
+func WriteOutput(filename string, data []byte) {
+	var err error
+
+	if filename == "-" {
+		_, err = os.Stdout.Write(data)
+	} else {
+		err = ioutil.WriteFile(filename, data, 0664)
+	}
+	if err != nil {
+		panic(err)
+	}
+}
 
+func LoadProblem(filename string) [][]bool {
+	return ParseProblem(ReadInput(filename))
+}
+
+func ParseProblem(data []byte) [][]bool {
 	lines := strings.Split(string(data), "\n")
 	matrix := make([][]bool, len(lines))
 
@@ -210,6 +307,81 @@ func LoadProblem(filename string) [][]bool {
 	return matrix
 }
 
+// Binary problem and solution files, see the format description in dance.py
+var ProblemMagic = []byte("DLXP")
+var SolutionMagic = []byte("DLXS")
+
+const FormatVersion = 1
+
+type Header struct {
+	Magic    [4]byte
+	Version  uint32
+	NRows    int64
+	NColumns int64
+	NNZ      int64
+}
+
+func IsBinary(data []byte, magic []byte) bool {
+	return bytes.HasPrefix(data, magic)
+}
+
+func LoadBinaryProblem(filename string) ([][]int, int) {
+	return ParseBinaryProblem(ReadInput(filename))
+}
+
+func ParseBinaryProblem(data []byte) ([][]int, int) {
+	reader := bytes.NewReader(data)
+	var header Header
+	if err := binary.Read(reader, binary.LittleEndian, &header); err != nil {
+		panic(err)
+	}
+	if !bytes.Equal(header.Magic[:], ProblemMagic) || header.Version != FormatVersion {
+		panic("not a supported binary problem")
+	}
+
+	indptr := make([]int64, header.NRows+1)
+	indices := make([]int32, header.NNZ)
+	if err := binary.Read(reader, binary.LittleEndian, indptr); err != nil {
+		panic(err)
+	}
+	if err := binary.Read(reader, binary.LittleEndian, indices); err != nil {
+		panic(err)
+	}
+
+	rows := make([][]int, header.NRows)
+	for i := range rows {
+		rows[i] = make([]int, 0, indptr[i+1]-indptr[i])
+		for _, c := range indices[indptr[i]:indptr[i+1]] {
+			rows[i] = append(rows[i], int(c))
+		}
+	}
+
+	return rows, int(header.NColumns)
+}
+
+func SaveBinarySolution(filename string, solution [][]int) {
+	indptr := make([]int64, 0, len(solution)+1)
+	keys := make([]int32, 0)
+
+	indptr = append(indptr, 0)
+	for _, s := range solution {
+		for _, v := range s {
+			keys = append(keys, int32(v))
+		}
+		indptr = append(indptr, int64(len(keys)))
+	}
+
+	header := Header{Version: FormatVersion, NRows: int64(len(solution)), NNZ: int64(len(keys))}
+	copy(header.Magic[:], SolutionMagic)
+
+	var buffer bytes.Buffer
+	binary.Write(&buffer, binary.LittleEndian, header)
+	binary.Write(&buffer, binary.LittleEndian, indptr)
+	binary.Write(&buffer, binary.LittleEndian, keys)
+
+	WriteOutput(filename, buffer.Bytes())
+}
+
 func SaveSolution(filename string, solution [][]int) {
 	lines := make([]string, 0, len(solution))
 	for _, s := range solution {
@@ -223,23 +395,47 @@ func SaveSolution(filename string, solution [][]int) {
 	lines = append(lines, "")
 	data := []byte(strings.Join(lines, "\n"))
 
-	err := ioutil.WriteFile(filename, data, 0664)
-	if err != nil {
-		panic(err)
-	}
+	WriteOutput(filename, data)
 }
 
 func main() {
 	if len(os.Args) < 3 {
-		fmt.Printf("Usage: %s <problem input> <solution output>\n", os.Args[0])
+		fmt.Printf("Usage: %s <problem input> <solution output> [limit]\n", os.Args[0])
+		fmt.Printf("Use - to read the problem from stdin or write solutions to stdout\n")
 		os.Exit(1)
 	}
 
-	matrix := LoadProblem(os.Args[1])
-	dl := BuildDancingLinks(matrix)
+	// Solutions are written in the same format as the problem was given
+	data := ReadInput(os.Args[1])
+	binary_format := IsBinary(data, ProblemMagic)
+
+	var dl *DancingLinks
+	if binary_format {
+		rows, n_columns := ParseBinaryProblem(data)
+		dl = BuildDancingLinksFromRows(rows, n_columns)
+	} else {
+		matrix := ParseProblem(data)
+		dl = BuildDancingLinks(matrix)
+	}
 	dl.use_greedy_column_selection = true
 
+	if len(os.Args) > 3 {
+		limit, err := strconv.Atoi(os.Args[3])
+		if err != nil {
+			panic(err)
+		}
+		if limit < 0 {
+			fmt.Fprintf(os.Stderr, "Limit must not be negative\n")
+			os.Exit(1)
+		}
+		dl.limit = limit
+	}
+
 	solutions := dl.AllSolutions()
 
-	SaveSolution(os.Args[2], solutions)
+	if binary_format {
+		SaveBinarySolution(os.Args[2], solutions)
+	} else {
+		SaveSolution(os.Args[2], solutions)
+	}
 }
@@ -1,7 +1,21 @@
+import collections
+import io
+import itertools
+import json
 import numpy as np
+import os
+import random
+import shutil
 import sys
+import tempfile
 import time
 
+import zdd
+
+clock = getattr(time, 'perf_counter', None) or time.clock
+cpu_clock = getattr(time, 'process_time', None) or time.clock
+replace = getattr(os, 'replace', os.rename)
+
 class Node(object):
     def __init__(self, key=None):
         self.key = key
@@ -10,37 +24,813 @@ class Node(object):
         self.U = self
         self.D = self
         self.C = self
+        self.color = 0
 
     def __repr__(self):
         return repr(self.key)
 
+class SparseMatrix(object):
+    """Exact cover problem stored as the column indices of each row
+
+    The layout is the same as a compressed sparse row matrix: the columns of
+    row i are indices[indptr[i]:indptr[i+1]], in increasing order.  Build and
+    search cost scale with the number of ones instead of rows x columns.
+    The optional data holds the value of each element, see element_colors,
+    and the last n_secondary columns are secondary, see DancingLinks.
+    """
+    def __init__(self, indptr, indices, shape, data=None, n_secondary=0):
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.shape = tuple(shape)
+        self.data = None if data is None else np.asarray(data)
+        self.n_secondary = n_secondary
+
+    @classmethod
+    def from_rows(cls, rows, n_columns):
+        """Build from a list with the column indices of each row"""
+        lengths = np.array([len(r) for r in rows], dtype=np.int64)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        indices = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64,
+                              count=indptr[-1])
+        keys = np.repeat(np.arange(len(rows)), lengths)
+        indices = indices[np.lexsort((indices, keys))]
+
+        return cls(indptr, indices, (len(rows), n_columns))
+
+    @classmethod
+    def from_dense(cls, matrix):
+        rows, columns = np.nonzero(matrix)
+        indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+
+        data = None
+        if matrix.dtype != np.bool:
+            data = matrix[rows, columns]
+
+        return cls(indptr, columns, matrix.shape, data)
+
+    @property
+    def nnz(self):
+        return self.indices.size
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def row_keys(self):
+        """Row key of every element, in the same order as indices"""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def empty_rows(self, rows):
+        """Copy with the rows where the boolean array rows is set emptied,
+        every row keeping its key"""
+        row_keys = self.row_keys()
+        keep = ~np.asarray(rows, dtype=bool)[row_keys]
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_keys[keep], minlength=self.shape[0]), out=indptr[1:])
+
+        data = None if self.data is None else self.data[keep]
+        return SparseMatrix(indptr, self.indices[keep], self.shape, data, self.n_secondary)
+
+    def tocsr(self):
+        return self
+
+    def toarray(self):
+        if self.data is None:
+            matrix = np.zeros(self.shape, dtype=np.bool)
+            matrix[self.row_keys(), self.indices] = True
+        else:
+            matrix = np.zeros(self.shape, dtype=self.data.dtype)
+            matrix[self.row_keys(), self.indices] = self.data
+        return matrix
+
+def as_sparse(matrix):
+    """Convert a dense array or scipy.sparse matrix to a SparseMatrix"""
+    if isinstance(matrix, SparseMatrix):
+        return matrix
+
+    if hasattr(matrix, 'tocsr'):
+        csr = matrix.tocsr(copy=True)
+        csr.eliminate_zeros()
+        csr.sort_indices()
+        return SparseMatrix(csr.indptr, csr.indices, csr.shape, csr.data)
+
+    return SparseMatrix.from_dense(np.asarray(matrix))
+
+def element_colors(matrix, n_secondary=0):
+    """Color of every element of a SparseMatrix, or None if none are colored
+
+    Values greater than one in the last n_secondary columns are colors,
+    rows with the same color in a secondary column may share it.  Elements
+    with the value one have color 0, and exclude every other row.
+    """
+    if matrix.data is None:
+        return None
+
+    data = matrix.data.astype(np.int64)
+    colors = np.where(data > 1, data, 0)
+    if not np.any(colors):
+        return None
+
+    if np.any(colors[matrix.indices < matrix.shape[1] - n_secondary]):
+        raise ValueError('Only secondary columns can have colors')
+    return colors
+
+def forced_problem(matrix, keys):
+    """Problem whose solutions are those containing all the given rows
+
+    Every other row sharing a column with one of them is emptied, for
+    solvers that cannot force rows themselves.  DancingLinks.force_rows is
+    faster since the columns of the forced rows are not searched at all.
+    """
+    matrix = as_sparse(matrix)
+    row_keys = matrix.row_keys()
+
+    columns = np.concatenate([matrix.row(k) for k in keys] + [np.zeros(0, dtype=int)])
+    if np.unique(columns).size != columns.size:
+        raise ValueError('Forced rows share a column')
+
+    forced_columns = np.zeros(matrix.shape[1], dtype=bool)
+    forced_columns[columns] = True
+
+    clash = np.zeros(matrix.shape[0], dtype=bool)
+    clash[row_keys[forced_columns[matrix.indices]]] = True
+    clash[list(keys)] = False
+    return matrix.empty_rows(clash)
+
+# Binary files hold a header followed by the rows in compressed sparse row
+# layout: little-endian int64 row pointers, then int32 entries.  Problems
+# store the column indices of each row and solutions the row keys of each
+# solution, so both can be memory mapped instead of parsed.
+#
+# Problems with secondary columns or colors are written as version 2, with
+# a trailer after the entries: the number of secondary columns and of colors
+# as int64, then the int32 color of every entry if there are any.
+PROBLEM_MAGIC = b'DLXP'
+SOLUTION_MAGIC = b'DLXS'
+FORMAT_VERSION = 1
+SECONDARY_VERSION = 2
+
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('n_rows', '<i8'),
+                   ('n_columns', '<i8'), ('nnz', '<i8')])
+TRAILER = np.dtype([('n_secondary', '<i8'), ('n_colors', '<i8')])
+
+def read_input(filename):
+    """Contents of a file, memory mapped, or of stdin for '-'"""
+    if filename == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin).read()
+    if os.path.getsize(filename) == 0:
+        return b''
+    return np.memmap(filename, dtype=np.uint8, mode='r')
+
+def write_output(filename, data):
+    """Write bytes to a file, or to stdout for '-'"""
+    if filename == '-':
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+        out.write(data)
+        out.flush()
+    else:
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+def is_binary(data, magic):
+    return bytes(data[:len(magic)]) == magic
+
+def pack_header(magic, n_rows, n_columns, nnz, version=FORMAT_VERSION):
+    header = np.zeros(1, dtype=HEADER)
+    header[0] = (magic, version, n_rows, n_columns, nnz)
+    return header.tobytes()
+
+def pack(magic, indptr, indices, n_columns, version=FORMAT_VERSION):
+    return b''.join([pack_header(magic, len(indptr) - 1, n_columns, len(indices), version),
+                     np.asarray(indptr, dtype='<i8').tobytes(),
+                     np.asarray(indices, dtype='<i4').tobytes()])
+
+def unpack(data, magic, versions=(FORMAT_VERSION,)):
+    """Row pointers and entries of binary data, as views without copying"""
+    if not is_binary(data, magic):
+        raise ValueError('Not a %s file' % magic.decode())
+
+    header = np.frombuffer(data, dtype=HEADER, count=1)[0]
+    if header['version'] not in versions:
+        raise ValueError('Unsupported file version %d' % header['version'])
+
+    n_rows = int(header['n_rows'])
+    nnz = int(header['nnz'])
+    offset = HEADER.itemsize
+
+    indptr = np.frombuffer(data, dtype='<i8', count=n_rows + 1, offset=offset)
+    offset += indptr.nbytes
+    indices = np.frombuffer(data, dtype='<i4', count=nnz, offset=offset)
+
+    return indptr, indices, int(header['n_columns'])
+
+def pack_problem(matrix, n_secondary=None):
+    """Binary data of a problem, version 2 if it has secondary columns
+
+    n_secondary defaults to that of a SparseMatrix.  Raises ValueError if
+    elements of primary columns have colors.
+    """
+    matrix = as_sparse(matrix)
+    if n_secondary is None:
+        n_secondary = matrix.n_secondary
+
+    colors = element_colors(matrix, n_secondary)
+    if n_secondary == 0:
+        return pack(PROBLEM_MAGIC, matrix.indptr, matrix.indices, matrix.shape[1])
+
+    trailer = np.zeros(1, dtype=TRAILER)
+    trailer[0] = (n_secondary, 0 if colors is None else colors.size)
+    return b''.join([pack(PROBLEM_MAGIC, matrix.indptr, matrix.indices, matrix.shape[1],
+                          SECONDARY_VERSION),
+                     trailer.tobytes(),
+                     b'' if colors is None else colors.astype('<i4').tobytes()])
+
+def unpack_problem(data):
+    """Problem from binary or text data, see load_problem"""
+    if not is_binary(data, PROBLEM_MAGIC):
+        return np.loadtxt(io.BytesIO(bytes(data)), ndmin=2)
+
+    indptr, indices, n_columns = unpack(data, PROBLEM_MAGIC,
+                                        (FORMAT_VERSION, SECONDARY_VERSION))
+    shape = (indptr.size - 1, n_columns)
+    if np.frombuffer(data, dtype=HEADER, count=1)[0]['version'] == FORMAT_VERSION:
+        return SparseMatrix(indptr, indices, shape)
+
+    offset = HEADER.itemsize + indptr.nbytes + indices.nbytes
+    trailer = np.frombuffer(data, dtype=TRAILER, count=1, offset=offset)[0]
+
+    # Elements without a color have the value one
+    values = None
+    if trailer['n_colors']:
+        colors = np.frombuffer(data, dtype='<i4', count=int(trailer['n_colors']),
+                               offset=offset + TRAILER.itemsize)
+        values = np.where(colors > 0, colors, 1)
+    return SparseMatrix(indptr, indices, shape, values, int(trailer['n_secondary']))
+
+def pack_solutions(solutions, text=False):
+    if text:
+        lines = [' '.join(map(str, sol)) + '\n' for sol in solutions]
+        return ''.join(lines).encode()
+
+    if isinstance(solutions, PackedSolutions):
+        indptr, keys = solutions.arrays()
+        return pack(SOLUTION_MAGIC, indptr, keys, 0)
+
+    indptr = np.zeros(len(solutions) + 1, dtype=np.int64)
+    np.cumsum([len(sol) for sol in solutions], out=indptr[1:])
+    keys = np.fromiter(itertools.chain.from_iterable(solutions), dtype=np.int64,
+                       count=indptr[-1])
+
+    return pack(SOLUTION_MAGIC, indptr, keys, 0)
+
+def unpack_solutions(data):
+    """Solutions from binary or text data, see load_solutions"""
+    if not is_binary(data, SOLUTION_MAGIC):
+        lines = bytes(data).decode().splitlines()
+        return [np.array(line.split(), dtype=int) for line in lines]
+
+    indptr, keys, _ = unpack(data, SOLUTION_MAGIC)
+    return [keys[indptr[i]:indptr[i+1]] for i in range(indptr.size - 1)]
+
+def save_problem(filename, matrix, text=False, n_secondary=None):
+    """Save a problem in the binary format, or as text with text=True
+
+    Text problems hold no secondary columns, see pack_problem for the
+    binary format.
+    """
+    matrix = as_sparse(matrix)
+    if text:
+        if (n_secondary or matrix.n_secondary) > 0:
+            raise ValueError('Text problems cannot have secondary columns')
+        np.savetxt(filename, matrix.toarray(), fmt='%d')
+    else:
+        write_output(filename, pack_problem(matrix, n_secondary))
+
+def load_problem(filename):
+    """Load a problem saved in either format, '-' reads stdin
+
+    Binary problems are returned as a SparseMatrix backed by a memory map,
+    with its n_secondary and colors, text problems as a dense array.
+    """
+    return unpack_problem(read_input(filename))
+
+def save_solutions(filename, solutions, text=False):
+    """Save solutions in the binary format, or one per line with text=True"""
+    write_output(filename, pack_solutions(solutions, text))
+
+def load_solutions(filename):
+    """Load solutions saved in either format as a list of row key arrays"""
+    return unpack_solutions(read_input(filename))
+
+# Solution sinks take each solution as a list of row keys as the search finds
+# it, instead of keeping a list of arrays.  Each has add, close and len.
+
+class PackedSolutions(object):
+    """Solutions packed into two arrays that grow as solutions are added
+
+    The arrays have the compressed sparse row layout of the binary files,
+    so a solution costs its keys and one row pointer instead of an array
+    object.  Indexing returns each solution as a view of the keys.
+    """
+    def __init__(self, capacity=1024):
+        self.indptr = np.zeros(capacity + 1, dtype=np.int64)
+        self.keys = np.zeros(capacity, dtype=np.int32)
+        self.n = 0
+
+    def add(self, keys):
+        start = int(self.indptr[self.n])
+        end = start + len(keys)
+
+        if self.n + 2 > self.indptr.size:
+            self.indptr = grow(self.indptr, self.n + 2)
+        if end > self.keys.size:
+            self.keys = grow(self.keys, end)
+
+        self.keys[start:end] = keys
+        self.n += 1
+        self.indptr[self.n] = end
+
+    def close(self):
+        pass
+
+    def arrays(self):
+        """Row pointers and keys of the solutions added"""
+        indptr = self.indptr[:self.n + 1]
+        return indptr, self.keys[:indptr[-1]]
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n
+        if not 0 <= i < self.n:
+            raise IndexError('Solution index out of range')
+        return self.keys[self.indptr[i]:self.indptr[i+1]]
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self[i]
+
+def grow(array, size):
+    """Copy of array with at least size elements, doubling its length"""
+    grown = np.zeros(max(size, 2 * array.size), dtype=array.dtype)
+    grown[:array.size] = array
+    return grown
+
+class SolutionWriter(object):
+    """Write solutions to a file as they are found, '-' writes to stdout
+
+    Text solutions are written one per line.  The header of a binary file
+    holds the number of solutions, so the keys and row pointers are streamed
+    to temporary files and copied after the header by close.  Only buffer
+    keys are held in memory at a time.
+    """
+    def __init__(self, filename, text=False, buffer_size=65536):
+        self.filename = filename
+        self.text = text
+        self.buffer_size = buffer_size
+
+        self.n = 0
+        self.nnz = 0
+        self.buffer = []
+        self.ends = []
+
+        if text:
+            self.out = self.open_output()
+        else:
+            self.keys = tempfile.TemporaryFile()
+            self.indptr = tempfile.TemporaryFile()
+            self.indptr.write(np.zeros(1, dtype='<i8').tobytes())
+
+    def open_output(self):
+        if self.filename == '-':
+            return getattr(sys.stdout, 'buffer', sys.stdout)
+        return open(self.filename, 'wb')
+
+    def add(self, keys):
+        self.n += 1
+        if self.text:
+            self.buffer.append(' '.join(map(str, keys)) + '\n')
+        else:
+            self.buffer.extend(keys)
+            self.nnz += len(keys)
+            self.ends.append(self.nnz)
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.text:
+            self.out.write(''.join(self.buffer).encode())
+        else:
+            self.keys.write(np.array(self.buffer, dtype='<i4').tobytes())
+            self.indptr.write(np.array(self.ends, dtype='<i8').tobytes())
+            self.ends = []
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+        if not self.text:
+            self.out = self.open_output()
+            self.out.write(pack_header(SOLUTION_MAGIC, self.n, 0, self.nnz))
+            for f in [self.indptr, self.keys]:
+                f.seek(0)
+                shutil.copyfileobj(f, self.out)
+                f.close()
+
+        if self.filename == '-':
+            self.out.flush()
+        else:
+            self.out.close()
+
+    def __len__(self):
+        return self.n
+
+class SolutionCallback(object):
+    """Call function with the row keys of each solution"""
+    def __init__(self, function):
+        self.function = function
+        self.n = 0
+
+    def add(self, keys):
+        self.n += 1
+        self.function(keys)
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return self.n
+
+def increment(counts, i):
+    """Add one to counts[i], growing the list of counts as needed"""
+    if i >= len(counts):
+        counts.extend([0] * (i + 1 - len(counts)))
+    counts[i] += 1
+
+class SearchStats(object):
+    """Counters collected during a search, see DancingLinks.start_stats
+
+    nodes_by_depth[d] is the number of nodes expanded with d rows chosen,
+    branching[b] the number of nodes whose column had b rows to try and
+    column_covers[i] the number of times column i was covered.  updates
+    counts the links changed by cover, Knuth's measure of the work done.
+    If given, progress is called with the stats every interval nodes.
+    """
+    def __init__(self, n_columns, progress=None, interval=100000):
+        self.nodes = 0
+        self.solutions = 0
+        self.updates = 0
+        self.nodes_by_depth = []
+        self.branching = []
+        self.column_covers = [0] * n_columns
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+        self.progress = progress
+        self.interval = interval
+        self.start()
+
+    def start(self):
+        self.start_wall = clock() - self.wall_time
+        self.start_cpu = cpu_clock() - self.cpu_time
+
+    def stop(self):
+        self.wall_time = clock() - self.start_wall
+        self.cpu_time = cpu_clock() - self.start_cpu
+
+    def node(self, depth, branching):
+        self.nodes += 1
+        increment(self.nodes_by_depth, depth)
+        increment(self.branching, branching)
+
+        if self.progress is not None and self.nodes % self.interval == 0:
+            self.stop()
+            self.progress(self)
+
+    def as_dict(self):
+        keys = ['nodes', 'solutions', 'updates', 'nodes_by_depth', 'branching',
+                'column_covers', 'wall_time', 'cpu_time']
+        return dict((k, getattr(self, k)) for k in keys)
+
+    def summary(self):
+        return ('Nodes searched: %d\nSolutions found: %d\nUpdates: %d\n'
+                'Time elapsed: %f\nCPU time: %f\n' %
+                (self.nodes, self.solutions, self.updates, self.wall_time,
+                 self.cpu_time))
+
+class TreeEstimate(object):
+    """Estimated number of nodes and solutions of a search tree
+
+    The bounds are the mean of the samples plus or minus the given number
+    of standard errors, the low bounds are never negative.
+    """
+    def __init__(self, nodes, solutions, z=1.96):
+        self.samples = len(nodes)
+        self.nodes, self.nodes_low, self.nodes_high = self.bounds(nodes, z)
+        self.solutions, self.solutions_low, self.solutions_high = self.bounds(solutions, z)
+
+    @staticmethod
+    def bounds(values, z):
+        values = np.array(values, dtype=float)
+        mean = values.mean()
+        error = z * values.std(ddof=1) / np.sqrt(values.size) if values.size > 1 else 0.0
+        return float(mean), float(max(mean - error, 0.0)), float(mean + error)
+
+    def as_dict(self):
+        keys = ['samples', 'nodes', 'nodes_low', 'nodes_high', 'solutions',
+                'solutions_low', 'solutions_high']
+        return dict((k, getattr(self, k)) for k in keys)
+
+class Checkpoint(object):
+    """Position of a search, saved to a small JSON file
+
+    The position is the column index and row key of every row on the stack,
+    below the prefix and forced rows the search was started with.  With
+    backtrack the node at the position has been searched and the search
+    continues with the next row.  The nodes searched so far are saved with
+    it.
+
+    Solutions are appended to filename + '.solutions' as they are found,
+    one per line as in the text format, and the checkpoint only holds how
+    many there are and the length of that file when it was saved.  Those
+    written after the last save are cut off when the search is resumed and
+    found again, so a save costs the same however many solutions there are.
+    """
+    def __init__(self, filename, interval=100000):
+        self.filename = filename
+        self.solutions_filename = filename + '.solutions'
+        self.interval = interval
+
+        self.prefix = []
+        self.forced = []
+        self.path = []
+        self.backtrack = False
+        self.nodes_searched = 0
+        self.n_solutions = 0
+        self.offset = 0
+        self.done = False
+        self.out = None
+
+    @classmethod
+    def load(cls, filename, interval=100000):
+        with open(filename) as f:
+            state = json.load(f)
+
+        checkpoint = cls(filename, interval)
+        checkpoint.prefix = state['prefix']
+        checkpoint.forced = state['forced']
+        checkpoint.path = [tuple(p) for p in state['path']]
+        checkpoint.backtrack = state['backtrack']
+        checkpoint.nodes_searched = state['nodes_searched']
+        checkpoint.n_solutions = state['n_solutions']
+        checkpoint.offset = state['solutions_offset']
+        checkpoint.done = state['done']
+        return checkpoint
+
+    def solutions(self):
+        """The solutions found up to the saved position"""
+        return list(self.iter_solutions())
+
+    def iter_solutions(self):
+        """Generate the solutions found up to the saved position, reading
+        the solutions file a line at a time"""
+        if not self.n_solutions:
+            return
+        with open(self.solutions_filename, 'rb') as f:
+            remaining = self.offset
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                yield np.array(line.split(), dtype=int)
+
+    def add(self, keys):
+        """Append a solution to the solutions file"""
+        if self.out is None:
+            # Anything after the saved position is found again
+            mode = 'r+b' if self.offset else 'wb'
+            self.out = open(self.solutions_filename, mode)
+            self.out.truncate(self.offset)
+            self.out.seek(self.offset)
+        self.out.write((' '.join(map(str, keys)) + '\n').encode())
+        self.n_solutions += 1
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def save(self, dl, stack, backtrack=False):
+        """Save the position of dl with the rows on stack
+
+        The solutions file is flushed first and the checkpoint file is
+        replaced in one step, so an interrupted save leaves the previous
+        checkpoint.
+        """
+        self.path = [(dl.column_index(dl.column_of(r)), dl.row_key(r))
+                     for r in stack[len(self.prefix):]]
+        self.backtrack = backtrack
+        self.nodes_searched = dl.nodes_searched
+        if self.out is not None:
+            self.out.flush()
+            self.offset = self.out.tell()
+
+        state = {'prefix': self.prefix,
+                 'forced': self.forced,
+                 'path': self.path,
+                 'backtrack': backtrack,
+                 'nodes_searched': self.nodes_searched,
+                 'n_solutions': self.n_solutions,
+                 'solutions_offset': self.offset,
+                 'done': self.done}
+
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        replace(temporary, self.filename)
+
+class SubproblemCache(object):
+    """Results of subproblems, such as their solution counts, keyed by
+    their covered columns
+
+    At most max_entries results are kept, the least recently used one is
+    evicted to make room.  hits, misses and evictions count the lookups
+    and evictions since the cache was made.
+    """
+    def __init__(self, max_entries=1000000):
+        self.max_entries = max_entries
+        self.results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.results)
+
+    def as_dict(self):
+        keys = ['max_entries', 'hits', 'misses', 'evictions']
+        return dict([(k, getattr(self, k)) for k in keys] + [('entries', len(self))])
+
+class SolutionProduct(object):
+    """Solutions of independent parts of a problem, built only when iterated
+
+    Each solution is keys followed by one solution of every part.  A part is
+    a list of SolutionProducts, the alternatives for its columns.  The size
+    is the product of the sizes of the parts, so solutions are counted
+    without building them.
+    """
+    def __init__(self, keys, parts=()):
+        self.keys = list(keys)
+        self.parts = list(parts)
+
+    def count(self):
+        count = 1
+        for part in self.parts:
+            count *= sum(p.count() for p in part)
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def key_lists(self):
+        """Generate the row keys of every solution as lists"""
+        def combine(i):
+            if i == len(self.parts):
+                yield []
+                return
+            for alternative in self.parts[i]:
+                for keys in alternative.key_lists():
+                    for rest in combine(i + 1):
+                        yield keys + rest
+
+        for rest in combine(0):
+            yield self.keys + rest
+
+    def __iter__(self):
+        for keys in self.key_lists():
+            yield np.array(keys, dtype=int)
+
 class DancingLinks(object):
-    def __init__(self, matrix, use_greedy_column_selection=True):
+    """Dancing links solver for exact cover problems
+
+    The matrix may be a dense array, a scipy.sparse matrix or a SparseMatrix,
+    use from_rows to build from lists of column indices.  The rows with keys
+    in forced_rows are part of every solution, see force_rows.
+
+    The last n_secondary columns are secondary: they are covered at most
+    once instead of exactly once, and never selected by the search.  Their
+    elements may have colors, see element_colors, and are then covered by
+    any number of rows of the same color.  n_secondary defaults to that of a
+    SparseMatrix, such as one loaded by load_problem.
+
+    column_selection is one of column_selections.  It defaults to 'scan',
+    or 'first' without use_greedy_column_selection.
+    """
+    column_selections = {
+        # Smallest column from lists of the columns by size, see
+        # build_buckets
+        'bucket': 'select_bucketed',
+        # Smallest column by scanning every remaining column
+        'scan': 'select_column',
+        # First remaining column
+        'first': 'select_first',
+    }
+
+    def __init__(self, matrix, use_greedy_column_selection=True, forced_rows=(),
+                 n_secondary=None, column_selection=None):
+        matrix = as_sparse(matrix)
+        if n_secondary is None:
+            n_secondary = matrix.n_secondary
+        colors = element_colors(matrix, n_secondary)
+        self.n_secondary = n_secondary
+        self.build(matrix, colors)
+
+        if column_selection is None:
+            column_selection = 'scan' if use_greedy_column_selection else 'first'
+        if column_selection not in self.column_selections:
+            raise ValueError('Unknown column selection %r' % column_selection)
+        self.column_selection = column_selection
+        self.use_greedy_column_selection = column_selection != 'first'
+
+        # Colors need the slower cover that skips purified elements
+        self.colored = colors is not None
+        if self.colored:
+            self.cover = self.cover_colored
+            self.uncover = self.uncover_colored
+            self.cover_row = self.commit_row
+            self.uncover_row = self.uncommit_row
+
+        self.buckets = None
+        if column_selection == 'bucket':
+            self.build_buckets()
+            self.hide = self.hide_bucketed
+            if not self.colored:
+                self.cover = self.cover_bucketed
+                self.uncover = self.uncover_bucketed
+        self.select_column = getattr(self, self.column_selections[column_selection])
+
+        self.stats = None
+        self.forced = []
+        self.forced_columns = set()
+        self.force_rows(forced_rows)
+
+    def build(self, matrix, colors=None):
         n_rows = matrix.shape[0]
         n_columns = matrix.shape[1]
 
-        self.build_empty_columns(n_columns)
-        for i, row in enumerate(matrix):
-            self.insert_row(row, i)
+        self.build_empty_columns(n_columns, self.n_secondary)
+        for i in range(n_rows):
+            start, end = matrix.indptr[i], matrix.indptr[i+1]
+            self.insert_columns(matrix.indices[start:end], i,
+                                None if colors is None else colors[start:end])
+
+    @classmethod
+    def from_rows(cls, rows, n_columns, **options):
+        """Build from a list with the column indices of each row"""
+        return cls(SparseMatrix.from_rows(rows, n_columns), **options)
 
-        self.use_greedy_column_selection = use_greedy_column_selection
+    def build_empty_columns(self, n_columns, n_secondary=0):
+        """Build an empty dancing links structure with given # of columns
 
-    def build_empty_columns(self, n_columns):
-        """Build an empty dancing links structure with given # of columns"""
+        The last n_secondary columns are left out of the list of columns to
+        cover, each one links only to itself.
+        """
         self.head = Node()
+        self.rows = {}
         self.columns = [Node(i) for i in range(n_columns)]
         for c in self.columns:
             c.size = 0
 
+        n_primary = self.n_primary = n_columns - n_secondary
         current = self.head
-        for i in range(n_columns):
+        for i in range(n_primary):
             current.R = self.columns[i]
             self.columns[i].L = current
             current = self.columns[i]
 
-        if self.columns:
-            self.columns[-1].R = self.head
-            self.head.L = self.columns[-1]
+        if n_primary:
+            self.columns[n_primary - 1].R = self.head
+            self.head.L = self.columns[n_primary - 1]
 
     def insert_single_element(self, c, key):
         """Insert a single element at the bottom of column c"""
@@ -58,14 +848,18 @@ class DancingLinks(object):
 
     def insert_row(self, row, key):
         """Insert the marker for every non-zero element"""
-        elements = np.nonzero(row)[0]
-        if elements.size == 0:
+        self.insert_columns(np.nonzero(row)[0], key)
+
+    def insert_columns(self, columns, key, colors=None):
+        """Insert a row with elements in the given columns and colors"""
+        if len(columns) == 0:
             return
 
-        first = self.insert_single_element(elements[0], key)
+        first = self.insert_single_element(columns[0], key)
         current = first
+        self.rows[key] = first
 
-        for c in np.nonzero(row)[0][1:]:
+        for c in columns[1:]:
             node = self.insert_single_element(c, key)
             current.R = node
             node.L = current
@@ -74,6 +868,12 @@ class DancingLinks(object):
         current.R = first
         first.L = current
 
+        if colors is not None:
+            node = first
+            for color in colors:
+                node.color = int(color)
+                node = node.R
+
     def cover(self, c):
         c.R.L = c.L
         c.L.R = c.R
@@ -102,11 +902,202 @@ class DancingLinks(object):
         c.R.L = c
         c.L.R = c
 
+    def cover_colored(self, c):
+        """Cover leaving purified elements, with color -1, in place"""
+        c.R.L = c.L
+        c.L.R = c.R
+        if self.buckets is not None and c.key < self.n_primary:
+            self.unlink_bucket(c)
+
+        i = c.D
+        while i != c:
+            self.hide(i)
+            i = i.D
+
+    def uncover_colored(self, c):
+        i = c.U
+        while i != c:
+            self.unhide(i)
+            i = i.U
+
+        c.R.L = c
+        c.L.R = c
+        if self.buckets is not None and c.key < self.n_primary:
+            self.link_bucket(c)
+
+    def hide(self, r):
+        """Unlink the other elements of the row of r from their columns"""
+        j = r.R
+        while j != r:
+            if j.color >= 0:
+                j.D.U = j.U
+                j.U.D = j.D
+                j.C.size -= 1
+            j = j.R
+
+    def unhide(self, r):
+        j = r.L
+        while j != r:
+            if j.color >= 0:
+                j.C.size += 1
+                j.D.U = j
+                j.U.D = j
+            j = j.L
+
+    def purify(self, p):
+        """Hide the rows with another color in the column of p
+
+        The rows with the same color stay, marked with color -1 so they are
+        not hidden again when they are chosen.
+        """
+        c = p.C
+        color = p.color
+
+        i = c.D
+        while i != c:
+            if i.color == color:
+                i.color = -1
+            else:
+                self.hide(i)
+            i = i.D
+
+    def unpurify(self, p):
+        c = p.C
+        color = p.color
+
+        i = c.U
+        while i != c:
+            if i.color < 0:
+                i.color = color
+            else:
+                self.unhide(i)
+            i = i.U
+
+    def build_buckets(self):
+        """Lists of the remaining primary columns by size
+
+        Each bucket has a header Node and its columns are linked through SL
+        and SR, like the column list.  column.filed is the bucket a column
+        is in, which is never more than its size: cover and hide move the
+        columns they shrink down to their new buckets, while uncover and
+        unhide leave the columns they grow where they are for
+        select_bucketed to move up when it meets them.  self.low is never
+        more than the smallest size with columns.
+        """
+        sizes = [c.size for c in self.columns]
+        self.buckets = []
+        for _ in range(max(sizes + [0]) + 1):
+            h = Node()
+            h.SL = h.SR = h
+            self.buckets.append(h)
+
+        self.low = 0
+        c = self.head.L
+        while c != self.head:
+            self.link_bucket(c)
+            c = c.L
+
+    def link_bucket(self, c):
+        """Put column c at the head of the bucket for its size"""
+        h = self.buckets[c.size]
+        c.SL = h
+        c.SR = h.SR
+        h.SR.SL = c
+        h.SR = c
+        c.filed = c.size
+        if c.size < self.low:
+            self.low = c.size
+
+    def unlink_bucket(self, c):
+        c.SL.SR = c.SR
+        c.SR.SL = c.SL
+
+    def refile(self, columns):
+        """Move the primary columns that shrank below their buckets"""
+        buckets, n_primary = self.buckets, self.n_primary
+        low = self.low
+
+        for c in columns:
+            s = c.size
+            if c.key < n_primary and s < c.filed:
+                c.SL.SR = c.SR
+                c.SR.SL = c.SL
+                h = buckets[s]
+                c.SL = h
+                c.SR = h.SR
+                h.SR.SL = c
+                h.SR = c
+                c.filed = s
+                if s < low:
+                    low = s
+        self.low = low
+
+    def cover_bucketed(self, c):
+        """cover refiling every column that shrinks"""
+        c.R.L = c.L
+        c.L.R = c.R
+        if c.key < self.n_primary:
+            self.unlink_bucket(c)
+
+        changed = []
+        i = c.D
+        while i != c:
+            j = i.R
+            while j != i:
+                j.D.U = j.U
+                j.U.D = j.D
+                j.C.size -= 1
+                changed.append(j.C)
+                j = j.R
+            i = i.D
+        self.refile(changed)
+
+    def uncover_bucketed(self, c):
+        DancingLinks.uncover(self, c)
+        if c.key < self.n_primary:
+            self.link_bucket(c)
+
+    def hide_bucketed(self, r):
+        changed = []
+        j = r.R
+        while j != r:
+            if j.color >= 0:
+                j.D.U = j.U
+                j.U.D = j.D
+                j.C.size -= 1
+                changed.append(j.C)
+            j = j.R
+        self.refile(changed)
+
+    def select_bucketed(self):
+        """Head of the first bucket from self.low up whose head has that
+        size, moving the heads that grew on to their buckets
+
+        Ties go to the column most recently filed, not the first in the
+        column list, so the search tree differs from that of select_column.
+        """
+        buckets = self.buckets
+        s = self.low
+        while True:
+            h = buckets[s]
+            c = h.SR
+            if c is h:
+                s += 1
+            elif c.size == s:
+                self.low = s
+                return c
+            else:
+                self.unlink_bucket(c)
+                self.link_bucket(c)
+
+    def select_first(self):
+        return self.head.R
+
     def select_column(self):
         if not self.use_greedy_column_selection:
             return self.head.R
 
-        best_size = sys.maxint
+        best_size = sys.maxsize
         best_c = None
 
         c = self.head.R
@@ -118,50 +1109,1157 @@ class DancingLinks(object):
 
         return best_c
 
-    def search(self):
-        if self.head.R == self.head:
-            self.all_solutions.append(np.array(self.solution))
-            return
+    def is_solved(self):
+        return self.head.R == self.head
 
-        c = self.select_column()
-        self.nodes_searched += 1
+    def down(self, node):
+        return node.D
 
-        self.cover(c)
-        r = c.D
-        while r != c:
-            self.solution.append(r.key)
-            j = r.R
-            while j != r:
+    def right(self, node):
+        return node.R
+
+    def column_of(self, node):
+        return node.C
+
+    def row_key(self, node):
+        return node.key
+
+    def color_of(self, node):
+        return node.color
+
+    def column_size(self, c):
+        return c.size
+
+    def column_index(self, c):
+        return c.key
+
+    def cover_row(self, r):
+        """Cover the columns of every other element in the row of r"""
+        j = r.R
+        while j != r:
+            self.cover(j.C)
+            j = j.R
+
+    def uncover_row(self, r):
+        """Undo cover_row, uncovering the columns in the opposite order"""
+        j = r.L
+        while j != r:
+            self.uncover(j.C)
+            j = j.L
+
+    def commit_row(self, r):
+        """cover_row for colored problems, purifying colored elements
+
+        Elements already purified by an earlier row are left alone.
+        """
+        j = r.R
+        while j != r:
+            if j.color == 0:
                 self.cover(j.C)
-                j = j.R
-            self.search()
-            j = r.L
-            while j != r:
+            elif j.color > 0:
+                self.purify(j)
+            j = j.R
+
+    def uncommit_row(self, r):
+        j = r.L
+        while j != r:
+            if j.color == 0:
                 self.uncover(j.C)
-                j = j.L
-            self.solution.pop()
-            r = r.D
-        self.uncover(c)
+            elif j.color > 0:
+                self.unpurify(j)
+            j = j.L
+
+    def row_nodes(self, r):
+        """Every element in the row of r, starting with r"""
+        nodes = [r]
+        j = self.right(r)
+        while j != r:
+            nodes.append(j)
+            j = self.right(j)
+        return nodes
+
+    def force_rows(self, keys):
+        """Cover the columns of the given rows before any search
+
+        The rows are part of every solution found until release_rows is
+        called, and the search only has to cover the remaining columns.
+        Raises ValueError for empty or unknown rows and rows that share a
+        column with a row already forced.
+        """
+        for key in keys:
+            if key not in self.rows:
+                raise ValueError('Row %r is empty or does not exist' % key)
+
+            # Elements purified by a forced row of the same color can share
+            # its column
+            r = self.rows[key]
+            nodes = self.row_nodes(r)
+            columns = [self.column_of(j) for j in nodes]
+            if any(c in self.forced_columns and self.color_of(j) >= 0
+                   for c, j in zip(columns, nodes)):
+                raise ValueError('Row %r clashes with a forced row' % key)
+
+            self.cover(self.column_of(r))
+            self.cover_row(r)
+            self.forced.append(r)
+            self.forced_columns.update(columns)
+
+    def release_rows(self):
+        """Uncover all forced rows, restoring the structure as built"""
+        while self.forced:
+            r = self.forced.pop()
+            self.uncover_row(r)
+            self.uncover(self.column_of(r))
+        self.forced_columns.clear()
+
+    def forced_keys(self):
+        return [self.row_key(r) for r in self.forced]
+
+    def solution_keys(self, stack):
+        """Row keys of a solution, the forced rows followed by the stack"""
+        row_key = self.row_key
+        return np.array([row_key(r) for r in self.forced] +
+                        [row_key(r) for r in stack])
+
+    def explore(self, prefix=(), max_depth=None, checkpoint=None):
+        """Walk the search tree depth first without recursion
+
+        The row chosen at each level is kept on the explicit stack
+        self.stack, the column it was chosen for is its own column.  The
+        stack is generated every time it holds a solution, so the search can
+        be paused and inspected there and continues when resumed.  If the
+        generator is closed early the covered columns are restored.
 
-    def generate_all_solutions(self):
-        self.solution = []
-        self.all_solutions = []
+        The rows with keys in prefix are chosen first, and only the subtree
+        below them is searched.  With max_depth the stack is also generated
+        at every node that deep, without searching below it.
+
+        With a Checkpoint the search continues from its path, and the
+        position is saved to it every checkpoint.interval nodes.
+        """
+        stack = self.stack = []
         self.nodes_searched = 0
 
-        start = time.clock()
-        self.search()
-        end = time.clock()
+        try:
+            for key in prefix:
+                r = self.rows[key]
+                self.cover(self.column_of(r))
+                self.cover_row(r)
+                stack.append(r)
+            base = len(stack)
+
+            skip = False
+            if checkpoint is not None:
+                for column, key in checkpoint.path:
+                    r = self.rows[key]
+                    while self.column_index(self.column_of(r)) != column:
+                        r = self.right(r)
+                    self.cover(self.column_of(r))
+                    self.cover_row(r)
+                    stack.append(r)
+
+                self.nodes_searched = checkpoint.nodes_searched
+                skip = checkpoint.backtrack
+                next_save = self.nodes_searched + checkpoint.interval
+
+            stats = self.stats
+            while True:
+                if skip:
+                    # The node was searched before the checkpoint
+                    skip = False
+                elif self.is_solved() or len(stack) == max_depth:
+                    if stats is not None and self.is_solved():
+                        stats.solutions += 1
+                    yield stack
+                else:
+                    if checkpoint is not None and self.nodes_searched >= next_save:
+                        checkpoint.save(self, stack)
+                        next_save = self.nodes_searched + checkpoint.interval
+
+                    c = self.select_column()
+                    self.nodes_searched += 1
+                    if stats is not None:
+                        stats.node(len(stack), self.column_size(c))
+
+                    self.cover(c)
+                    r = self.down(c)
+                    if r != c:
+                        self.cover_row(r)
+                        stack.append(r)
+                        continue
+                    self.uncover(c)
+
+                # Backtrack to the next untried row at the deepest level
+                while len(stack) > base:
+                    r = stack.pop()
+                    self.uncover_row(r)
+                    c = self.column_of(r)
+                    r = self.down(r)
+                    if r != c:
+                        self.cover_row(r)
+                        stack.append(r)
+                        break
+                    self.uncover(c)
+                else:
+                    return
+        finally:
+            while stack:
+                r = stack.pop()
+                self.uncover_row(r)
+                self.uncover(self.column_of(r))
+
+    def split(self, levels):
+        """Row keys chosen along every path to the given depth of the tree
+
+        Each prefix is a separate branch of the search, searching below all of
+        them in order finds the same solutions as one search of the whole
+        tree.  Prefixes of solutions shallower than levels are included.
+        """
+        row_key = self.row_key
+        return [[row_key(r) for r in stack]
+                for stack in self.explore(max_depth=levels)]
+
+    def iter_solutions(self):
+        """Generate each solution as soon as the search finds it"""
+        for stack in self.explore():
+            yield self.solution_keys(stack)
+
+    def solve(self, limit=None, sink=None):
+        """Find up to limit solutions, stopping the search once found
+
+        The solutions are returned as a list of arrays, or with a sink such
+        as PackedSolutions they are added to it as they are found and the
+        sink is returned.  The sink is not closed.
+        """
+        if sink is None:
+            solutions = self.iter_solutions()
+            try:
+                return list(itertools.islice(solutions, limit))
+            finally:
+                solutions.close()
+
+        forced = self.forced_keys()
+        row_key = self.row_key
+        stacks = self.explore()
+        try:
+            for stack in itertools.islice(stacks, limit):
+                sink.add(forced + [row_key(r) for r in stack])
+        finally:
+            stacks.close()
+        return sink
+
+    def all_solutions(self):
+        return self.solve()
+
+    def count_solutions(self, by_depth=False):
+        """Count the solutions without building any of them
+
+        With by_depth the counts are also returned broken down by the number
+        of rows in the solution, as a list indexed by depth.
+        """
+        count = 0
+        depths = []
+
+        for stack in self.explore():
+            count += 1
+            if by_depth:
+                increment(depths, len(self.forced) + len(stack))
+
+        if by_depth:
+            return count, depths
+        return count
+
+    def memoized_search(self, cache, combine, solved):
+        """Fold the search tree, reusing the result of every subproblem
+        reached again through other rows
+
+        A subproblem is keyed by the bitmask of its covered columns, which
+        fixes the rows and columns left, and its result kept in cache, a
+        SubproblemCache.  Its result is solved if no columns are left, or
+        combine of the (row key, result) pairs of the rows of the column
+        selected.  Colored problems are not supported, the rows left there
+        also depend on the colors.
+        """
+        if self.colored:
+            raise ValueError('Memoized search does not support colors')
+
+        right, down = self.right, self.down
+        column_of, column_index, row_key = self.column_of, self.column_index, self.row_key
+
+        masks = {}
+        for key, r in self.rows.items():
+            mask = 1 << column_index(column_of(r))
+            j = right(r)
+            while j != r:
+                mask |= 1 << column_index(column_of(j))
+                j = right(j)
+            masks[key] = mask
+
+        mask = 0
+        for r in self.forced:
+            mask |= masks[row_key(r)]
+
+        # Each frame is the column, row chosen, mask and results so far
+        frames = []
+        self.nodes_searched = 0
+        try:
+            while True:
+                if self.is_solved():
+                    result = solved
+                else:
+                    result = cache.get(mask)
+                    if result is None:
+                        c = self.select_column()
+                        self.nodes_searched += 1
+                        self.cover(c)
+                        r = down(c)
+                        if r != c:
+                            self.cover_row(r)
+                            frames.append([c, r, mask, []])
+                            mask |= masks[row_key(r)]
+                            continue
+                        self.uncover(c)
+                        result = combine([])
+                        cache.put(mask, result)
+
+                # Pass the result to the parent and move on to its next row
+                while frames:
+                    frame = frames[-1]
+                    c, r = frame[0], frame[1]
+                    frame[3].append((row_key(r), result))
+                    self.uncover_row(r)
+                    r = down(r)
+                    if r != c:
+                        self.cover_row(r)
+                        frame[1] = r
+                        mask = frame[2] | masks[row_key(r)]
+                        break
+                    self.uncover(c)
+                    frames.pop()
+                    result = combine(frame[3])
+                    cache.put(frame[2], result)
+                else:
+                    return result
+        finally:
+            while frames:
+                c, r = frames.pop()[:2]
+                self.uncover_row(r)
+                self.uncover(c)
+
+    def count_memoized(self, cache=None, max_entries=1000000):
+        """Count the solutions with memoized_search
+
+        The counts are kept in a SubproblemCache, made with max_entries
+        unless one is given, and the count and cache are returned.  A cache
+        can be reused by later counts on the same structure.
+        """
+        if cache is None:
+            cache = SubproblemCache(max_entries)
+
+        def combine(results):
+            return sum(count for key, count in results)
+
+        return self.memoized_search(cache, combine, 1), cache
+
+    def build_zdd(self, table=None, max_entries=1000000):
+        """Every solution as a zdd.ZDD, built with memoized_search
+
+        The ZDD of a subproblem is a chain through the rows of the column
+        selected, each row leading on to the ZDD of the subproblem left by
+        it.  Nodes are shared through the unique table of table, a
+        zdd.NodeTable, made unless one is given.  Evicting a subproblem from
+        the cache of max_entries only costs building its nodes again, the
+        unique table shares them as before.
+        """
+        if table is None:
+            table = zdd.NodeTable()
+
+        def combine(results):
+            node = zdd.EMPTY
+            for key, child in reversed(results):
+                node = table.node(key, node, child)
+            return node
+
+        root = self.memoized_search(SubproblemCache(max_entries), combine, zdd.BASE)
+        for key in reversed(self.forced_keys()):
+            root = table.node(key, zdd.EMPTY, root)
+        return zdd.ZDD(table, root)
+
+    def is_unique(self):
+        """True if there is exactly one solution, stops at the second one"""
+        return len(self.solve(limit=2)) == 1
+
+    def components(self):
+        """Remaining primary columns grouped into components no row connects
+
+        Returns the column headers of each component, in the order of the
+        column list.  A secondary column connects the components of its rows.
+        """
+        parent = {}
+
+        def find(i):
+            while parent.get(i, i) != i:
+                parent[i] = parent.get(parent[i], parent[i])
+                i = parent[i]
+            return i
+
+        right, down = self.right, self.down
+        column_of, column_index = self.column_of, self.column_index
+
+        headers = []
+        c = right(self.head)
+        while c != self.head:
+            headers.append(c)
+            i = find(column_index(c))
+            r = down(c)
+            while r != c:
+                j = right(r)
+                while j != r:
+                    k = find(column_index(column_of(j)))
+                    if k != i:
+                        parent[k] = i
+                    j = right(j)
+                r = down(r)
+            c = right(c)
+
+        components = {}
+        order = []
+        for c in headers:
+            root = find(column_index(c))
+            if root not in components:
+                components[root] = []
+                order.append(root)
+            components[root].append(c)
+        return [components[root] for root in order]
+
+    def search_components(self, levels, count_only, split=True):
+        """Solutions, as a list of SolutionProducts, or the count of the
+        remaining columns
+
+        If the columns split into components each is searched on its own,
+        with the columns of the others covered, and the results multiplied.
+        Components are looked for at the root and at nodes less than levels
+        deep, below them explore searches.
+        """
+        if split:
+            components = self.components()
+            if len(components) > 1:
+                parts = []
+                for k in range(len(components)):
+                    others = [c for i, columns in enumerate(components) if i != k
+                              for c in columns]
+                    for c in others:
+                        self.cover(c)
+                    try:
+                        part = self.search_components(levels, count_only, split=False)
+                    finally:
+                        for c in reversed(others):
+                            self.uncover(c)
+                    if not part:
+                        return 0 if count_only else []
+                    parts.append(part)
+
+                if count_only:
+                    count = 1
+                    for part in parts:
+                        count *= part
+                    return count
+                return [SolutionProduct([], parts)]
+
+        if levels <= 0 or self.is_solved():
+            if count_only:
+                return sum(1 for _ in self.explore())
+            row_key = self.row_key
+            return [SolutionProduct([row_key(r) for r in stack]) for stack in self.explore()]
+
+        results = 0 if count_only else []
+        c = self.select_column()
+        self.cover(c)
+        try:
+            r = self.down(c)
+            while r != c:
+                self.cover_row(r)
+                try:
+                    found = self.search_components(levels - 1, count_only)
+                finally:
+                    self.uncover_row(r)
+
+                if count_only:
+                    results += found
+                elif found:
+                    results.append(SolutionProduct([self.row_key(r)], [found]))
+                r = self.down(r)
+        finally:
+            self.uncover(c)
+        return results
+
+    def count_by_components(self, levels=0):
+        """Count the solutions, multiplying the counts of independent
+        components
+
+        Components are looked for at the root and at nodes less than levels
+        deep.  Columns that split into components are searched one after the
+        other instead of every combination of their rows.
+        """
+        return self.search_components(levels, True)
+
+    def solve_by_components(self, levels=0):
+        """Every solution as a SolutionProduct, see count_by_components
+
+        The solutions of the components are combined as they are iterated.
+        """
+        return SolutionProduct(self.forced_keys(), [self.search_components(levels, False)])
+
+    def estimate_tree_size(self, samples=100, prefix=(), seed=None, z=1.96):
+        """Estimate the nodes and solutions of the search by random paths
+
+        Knuth's estimator: each sample walks from the root to a leaf with the
+        same column selection as the search, choosing a random row at each
+        node.  A node reached through columns with d1, d2, ... rows stands
+        for d1 * d2 * ... nodes at its depth, so the weights along a path
+        sum to an unbiased estimate of nodes_searched.  With prefix the
+        subtree below those rows is estimated, as for a work unit.
+
+        Returns a TreeEstimate with bounds of z standard errors.  The
+        structure is left as it was.  Raises ValueError for fewer than one
+        sample.
+        """
+        if samples < 1:
+            raise ValueError('At least one sample is needed')
+
+        rng = random.Random(seed)
+        path = []
+        nodes = []
+        solutions = []
+
+        try:
+            for key in prefix:
+                r = self.rows[key]
+                self.cover(self.column_of(r))
+                self.cover_row(r)
+                path.append(r)
+            base = len(path)
+
+            for _ in range(samples):
+                weight = 1
+                n = 0
+                found = 0
+
+                while True:
+                    if self.is_solved():
+                        found = weight
+                        break
+
+                    c = self.select_column()
+                    n += weight
+                    d = self.column_size(c)
+                    if d == 0:
+                        break
+                    weight *= d
+
+                    r = self.down(c)
+                    for _ in range(rng.randrange(d)):
+                        r = self.down(r)
+                    self.cover(c)
+                    self.cover_row(r)
+                    path.append(r)
+
+                while len(path) > base:
+                    r = path.pop()
+                    self.uncover_row(r)
+                    self.uncover(self.column_of(r))
+
+                nodes.append(n)
+                solutions.append(found)
+        finally:
+            while path:
+                r = path.pop()
+                self.uncover_row(r)
+                self.uncover(self.column_of(r))
+
+        return TreeEstimate(nodes, solutions, z)
+
+    def solve_with_checkpoints(self, filename, limit=None, interval=100000, prefix=(),
+                               sink=None):
+        """Find up to limit solutions, saving the position every interval
+        nodes
+
+        The search can be continued from the checkpoint file with resume if
+        it is interrupted or stopped by the limit.  The solutions are
+        returned as a list, or added to sink as in solve.
+        """
+        checkpoint = Checkpoint(filename, interval)
+        checkpoint.prefix = [int(key) for key in prefix]
+        checkpoint.forced = self.forced_keys()
+        return self.run_from_checkpoint(checkpoint, limit, sink)
+
+    def resume(self, filename, limit=None, interval=100000, sink=None):
+        """Continue a search saved by solve_with_checkpoints
+
+        The structure must be built from the same problem with the same
+        options, the forced rows of the checkpoint are forced if no rows are.
+        Returns every solution, those found before the checkpoint first, up
+        to limit solutions in total.  With a sink they are added to it
+        instead, those found before the checkpoint read back from its
+        solutions file one at a time.
+        """
+        checkpoint = Checkpoint.load(filename, interval)
+        if not self.forced:
+            self.force_rows(checkpoint.forced)
+        if self.forced_keys() != checkpoint.forced:
+            raise ValueError('Forced rows differ from the checkpoint')
+
+        return self.run_from_checkpoint(checkpoint, limit, sink)
+
+    def run_from_checkpoint(self, checkpoint, limit, sink=None):
+        solutions = [] if sink is None else sink
+        add = solutions.append if sink is None else sink.add
+
+        n = 0
+        for keys in itertools.islice(checkpoint.iter_solutions(), limit):
+            add(keys)
+            n += 1
+        if checkpoint.done or (limit is not None and n >= limit):
+            return solutions
+
+        stacks = self.explore(checkpoint.prefix, checkpoint=checkpoint)
+        try:
+            for stack in stacks:
+                keys = self.solution_keys(stack)
+                checkpoint.add(keys)
+                add(keys)
+                n += 1
+                if limit is not None and n >= limit:
+                    checkpoint.save(self, stack, backtrack=True)
+                    break
+            else:
+                checkpoint.done = True
+                checkpoint.save(self, [])
+        finally:
+            stacks.close()
+            checkpoint.close()
+
+        return solutions
+
+    def start_stats(self, progress=None, interval=100000):
+        """Collect SearchStats in self.stats during every search until
+        stop_stats is called
 
-        print('Nodes searched: %d' % self.nodes_searched)
-        print('Solutions found: %d' % len(self.all_solutions))
-        print('Time elapsed: %f' % (end - start))
-        return self.all_solutions
+        cover is wrapped to count covers and updates, so the search is
+        slower while stats are collected.  Raises ValueError if stats are
+        already being collected.
+        """
+        if self.stats is not None:
+            raise ValueError('Stats are already being collected')
+        self.stats = SearchStats(len(self.columns), progress, interval)
+
+        row_sizes = dict((key, len(self.row_nodes(r))) for key, r in self.rows.items())
+        stats = self.stats
+        cover = self.cover
+        down, row_key, column_index = self.down, self.row_key, self.column_index
+
+        def counting_cover(c):
+            stats.column_covers[column_index(c)] += 1
+            updates = 1
+            i = down(c)
+            while i != c:
+                updates += row_sizes[row_key(i)] - 1
+                i = down(i)
+            stats.updates += updates
+            cover(c)
+
+        self.uncounted_cover = cover
+        self.cover = counting_cover
+        return self.stats
+
+    def stop_stats(self):
+        """Stop collecting stats, returning them"""
+        stats = self.stats
+        stats.stop()
+        self.cover = self.uncounted_cover
+        self.stats = None
+        return stats
+
+    def solve_with_stats(self, limit=None, progress=None, interval=100000, sink=None):
+        """Find up to limit solutions, returning them and the SearchStats"""
+        self.start_stats(progress, interval)
+        try:
+            solutions = self.solve(limit, sink)
+        finally:
+            stats = self.stop_stats()
+        return solutions, stats
+
+    def generate_all_solutions(self, limit=None):
+        """Find up to limit solutions, keeping the stats in self.last_stats"""
+        self.solutions, self.last_stats = self.solve_with_stats(limit)
+        return self.solutions
+
+class ArrayDancingLinks(DancingLinks):
+    """Dancing links stored in flat integer arrays instead of Node objects.
+
+    Every node is an index: 0 is the head, 1..n are the column headers and
+    the matrix elements follow in row-major order.  L, R, U, D, C and key
+    hold the links, column header and row key of each node, size holds the
+    number of elements in each column (indexed by header).  color holds
+    the color of each node once any element has one.
+
+    It builds about twice as fast as DancingLinks and takes about two
+    thirds of the memory, but searches at the same speed: under CPython an
+    index into a list costs as much as an attribute of a Node.
+    """
+    def build(self, matrix, colors=None):
+        self.build_empty_columns(matrix.shape[1], self.n_secondary)
+        self.insert_elements(matrix.row_keys(), matrix.indices, colors)
+
+    def build_empty_columns(self, n_columns, n_secondary=0):
+        """Build an empty dancing links structure with given # of columns
+
+        The last n_secondary columns are left out of the list of columns to
+        cover, each one links only to itself.
+        """
+        n = n_columns + 1
+        n_primary = self.n_primary = n_columns - n_secondary
+        self.head = 0
+        self.columns = list(range(1, n))
+
+        self.L = [n_primary] + list(range(n_primary)) + list(range(n_primary + 1, n))
+        self.R = list(range(1, n_primary + 1)) + [0] + list(range(n_primary + 1, n))
+        self.U = list(range(n))
+        self.D = list(range(n))
+        self.C = list(range(n))
+        self.key = [None] + list(range(n_columns))
+        self.size = [0] * n
+        self.color = None
+        self.rows = {}
+
+    def insert_elements(self, rows, columns, colors=None):
+        """Insert elements given as (row key, column) pairs in row-major order
+
+        The links for all elements are computed at once, so this is much
+        faster than inserting the rows one at a time.  colors optionally
+        gives the color of each element.
+        """
+        n_elements = len(rows)
+        if n_elements == 0:
+            return
+
+        rows = np.asarray(rows)
+        headers = np.asarray(columns) + 1
+        first = len(self.L)
+        nodes = np.arange(first, first + n_elements)
+
+        # Link each row into a circular list, the elements of a row are
+        # adjacent so the neighbours are the previous and next nodes.
+        row_start = np.ones(n_elements, dtype=bool)
+        row_start[1:] = rows[1:] != rows[:-1]
+        row_end = np.roll(row_start, -1)
+        starts = np.maximum.accumulate(np.where(row_start, nodes, 0))
+        ends = np.minimum.accumulate(np.where(row_end, nodes, nodes[-1])[::-1])[::-1]
+
+        L = np.where(row_start, ends, nodes - 1)
+        R = np.where(row_end, starts, nodes + 1)
+
+        # Append each element to the bottom of its column in row order.
+        order = np.argsort(headers, kind='stable')
+        by_column = nodes[order]
+        column_of = headers[order]
+        column_start = np.ones(n_elements, dtype=bool)
+        column_start[1:] = column_of[1:] != column_of[:-1]
+        column_end = np.roll(column_start, -1)
+
+        U = np.empty(n_elements, dtype=np.int64)
+        D = np.empty(n_elements, dtype=np.int64)
+        U[order] = np.where(column_start, -1, np.roll(by_column, 1))
+        D[order] = np.where(column_end, column_of, np.roll(by_column, -1))
+
+        # Share one int object per index between the arrays, a fresh int
+        # for every entry would take several times the memory of the links.
+        ints = list(range(max(first + n_elements, rows.max() + 1)))
+        lookup = ints.__getitem__
+
+        self.L.extend(map(lookup, L.tolist()))
+        self.R.extend(map(lookup, R.tolist()))
+        self.U.extend(map(lookup, U.tolist()))
+        self.D.extend(map(lookup, D.tolist()))
+        self.C.extend(map(lookup, headers.tolist()))
+        self.key.extend(map(lookup, rows.tolist()))
+
+        if colors is not None and self.color is None:
+            self.color = [0] * first
+        if self.color is not None:
+            if colors is None:
+                colors = np.zeros(n_elements, dtype=int)
+            self.color.extend(np.asarray(colors).tolist())
+        self.rows.update(zip(map(lookup, rows[row_start].tolist()),
+                             map(lookup, nodes[row_start].tolist())))
+
+        # Splice the new elements below any existing ones in each column.
+        U, D, size = self.U, self.D, self.size
+        for c, top, bottom in zip(column_of[column_start].tolist(),
+                                  by_column[column_start].tolist(),
+                                  by_column[column_end].tolist()):
+            last = U[c]
+            D[last] = top
+            U[top] = last
+            U[c] = bottom
+
+        for c, count in zip(*np.unique(headers, return_counts=True)):
+            size[c] += int(count)
+
+    def insert_columns(self, columns, key, colors=None):
+        """Insert a row with elements in the given columns and colors"""
+        self.insert_elements(np.repeat(key, len(columns)), columns, colors)
+
+    def cover(self, c):
+        L, R, U, D, C, size = self.L, self.R, self.U, self.D, self.C, self.size
+
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                size[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, size = self.L, self.R, self.U, self.D, self.C, self.size
+
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                size[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+
+        R[L[c]] = c
+        L[R[c]] = c
+
+    def cover_colored(self, c):
+        """Cover leaving purified elements, with color -1, in place"""
+        L, R, D = self.L, self.R, self.D
+
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        if self.buckets is not None and c <= self.n_primary:
+            self.unlink_bucket(c)
+
+        i = D[c]
+        while i != c:
+            self.hide(i)
+            i = D[i]
+
+    def uncover_colored(self, c):
+        L, R, U = self.L, self.R, self.U
+
+        i = U[c]
+        while i != c:
+            self.unhide(i)
+            i = U[i]
+
+        R[L[c]] = c
+        L[R[c]] = c
+        if self.buckets is not None and c <= self.n_primary:
+            self.link_bucket(c)
+
+    def hide(self, r):
+        """Unlink the other elements of the row of r from their columns"""
+        R, U, D, C, size, color = self.R, self.U, self.D, self.C, self.size, self.color
+
+        j = R[r]
+        while j != r:
+            if color[j] >= 0:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                size[C[j]] -= 1
+            j = R[j]
+
+    def unhide(self, r):
+        L, U, D, C, size, color = self.L, self.U, self.D, self.C, self.size, self.color
+
+        j = L[r]
+        while j != r:
+            if color[j] >= 0:
+                size[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+            j = L[j]
+
+    def purify(self, p):
+        """Hide the rows with another color in the column of p
+
+        The rows with the same color stay, marked with color -1 so they are
+        not hidden again when they are chosen.
+        """
+        D, color = self.D, self.color
+        c = self.C[p]
+        x = color[p]
+
+        i = D[c]
+        while i != c:
+            if color[i] == x:
+                color[i] = -1
+            else:
+                self.hide(i)
+            i = D[i]
+
+    def unpurify(self, p):
+        U, color = self.U, self.color
+        c = self.C[p]
+        x = color[p]
+
+        i = U[c]
+        while i != c:
+            if color[i] < 0:
+                color[i] = x
+            else:
+                self.unhide(i)
+            i = U[i]
+
+    def build_buckets(self):
+        """Lists of the headers of the remaining primary columns by size
+
+        The lists are linked through SL and SR, the header of the bucket
+        for size s is self.bucket_base + s.  filed holds the bucket of
+        each column, kept as in DancingLinks.build_buckets.
+        """
+        L, size = self.L, self.size
+        n_buckets = max(size) + 1
+        base = self.bucket_base = len(size)
+        self.SL = list(range(base + n_buckets))
+        self.SR = list(range(base + n_buckets))
+        self.filed = list(size)
+        self.buckets = list(range(base, base + n_buckets))
+
+        self.low = 0
+        c = L[0]
+        while c != 0:
+            self.link_bucket(c)
+            c = L[c]
+
+    def link_bucket(self, c):
+        """Put column c at the head of the bucket for its size"""
+        SL, SR, s = self.SL, self.SR, self.size[c]
+        h = self.bucket_base + s
+        SL[c] = h
+        SR[c] = SR[h]
+        SL[SR[h]] = c
+        SR[h] = c
+        self.filed[c] = s
+        if s < self.low:
+            self.low = s
+
+    def unlink_bucket(self, c):
+        SL, SR = self.SL, self.SR
+        SR[SL[c]] = SR[c]
+        SL[SR[c]] = SL[c]
+
+    def refile(self, columns):
+        """Move the primary columns that shrank below their buckets"""
+        SL, SR, size, filed = self.SL, self.SR, self.size, self.filed
+        base, n_primary = self.bucket_base, self.n_primary
+        low = self.low
+
+        for k in columns:
+            s = size[k]
+            if k <= n_primary and s < filed[k]:
+                SR[SL[k]] = SR[k]
+                SL[SR[k]] = SL[k]
+                h = base + s
+                SL[k] = h
+                SR[k] = SR[h]
+                SL[SR[h]] = k
+                SR[h] = k
+                filed[k] = s
+                if s < low:
+                    low = s
+        self.low = low
+
+    def cover_bucketed(self, c):
+        """cover refiling every column that shrinks"""
+        L, R, U, D, C, size = self.L, self.R, self.U, self.D, self.C, self.size
+
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        if c <= self.n_primary:
+            self.unlink_bucket(c)
+
+        changed = []
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                k = C[j]
+                size[k] -= 1
+                changed.append(k)
+                j = R[j]
+            i = D[i]
+        self.refile(changed)
+
+    def uncover_bucketed(self, c):
+        ArrayDancingLinks.uncover(self, c)
+        if c <= self.n_primary:
+            self.link_bucket(c)
+
+    def hide_bucketed(self, r):
+        R, U, D, C, size, color = self.R, self.U, self.D, self.C, self.size, self.color
+
+        changed = []
+        j = R[r]
+        while j != r:
+            if color[j] >= 0:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                k = C[j]
+                size[k] -= 1
+                changed.append(k)
+            j = R[j]
+        self.refile(changed)
+
+    def select_bucketed(self):
+        """As DancingLinks.select_bucketed"""
+        SR, size, base = self.SR, self.size, self.bucket_base
+        s = self.low
+        while True:
+            h = base + s
+            c = SR[h]
+            if c == h:
+                s += 1
+            elif size[c] == s:
+                self.low = s
+                return c
+            else:
+                self.unlink_bucket(c)
+                self.link_bucket(c)
+
+    def select_first(self):
+        return self.R[0]
+
+    def select_column(self):
+        R, size = self.R, self.size
+
+        if not self.use_greedy_column_selection:
+            return R[0]
+
+        best_size = sys.maxsize
+        best_c = None
+
+        c = R[0]
+        while c != 0:
+            if size[c] < best_size:
+                best_size = size[c]
+                best_c = c
+            c = R[c]
+
+        return best_c
+
+    def is_solved(self):
+        return self.R[0] == 0
+
+    def down(self, node):
+        return self.D[node]
+
+    def right(self, node):
+        return self.R[node]
+
+    def column_of(self, node):
+        return self.C[node]
+
+    def row_key(self, node):
+        return self.key[node]
+
+    def color_of(self, node):
+        return 0 if self.color is None else self.color[node]
+
+    def column_size(self, c):
+        return self.size[c]
+
+    def column_index(self, c):
+        return c - 1
+
+    def cover_row(self, r):
+        """Cover the columns of every other element in the row of r"""
+        R, C = self.R, self.C
+
+        j = R[r]
+        while j != r:
+            self.cover(C[j])
+            j = R[j]
+
+    def uncover_row(self, r):
+        """Undo cover_row, uncovering the columns in the opposite order"""
+        L, C = self.L, self.C
+
+        j = L[r]
+        while j != r:
+            self.uncover(C[j])
+            j = L[j]
+
+    def commit_row(self, r):
+        """cover_row for colored problems, purifying colored elements
+
+        Elements already purified by an earlier row are left alone.
+        """
+        R, C, color = self.R, self.C, self.color
+
+        j = R[r]
+        while j != r:
+            if color[j] == 0:
+                self.cover(C[j])
+            elif color[j] > 0:
+                self.purify(j)
+            j = R[j]
+
+    def uncommit_row(self, r):
+        L, C, color = self.L, self.C, self.color
+
+        j = L[r]
+        while j != r:
+            if color[j] == 0:
+                self.uncover(C[j])
+            elif color[j] > 0:
+                self.unpurify(j)
+            j = L[j]
 
 if __name__ == '__main__':
-    mat = np.loadtxt(sys.argv[1])
-    dl = DancingLinks(mat)
-    solutions = dl.generate_all_solutions()
+    args = sys.argv[1:]
+    checkpoint = None
+    if '--checkpoint' in args:
+        i = args.index('--checkpoint')
+        checkpoint = args[i + 1] if i + 1 < len(args) else None
+        args = args[:i] + args[i + 2:]
+
+    if len(args) < 2 or ('--checkpoint' in sys.argv and checkpoint is None):
+        print('Usage: %s <problem input> <solution output> [limit] [--checkpoint <file>]' % sys.argv[0])
+        print('Use - to read the problem from stdin or write solutions to stdout')
+        print('An existing checkpoint file is resumed, otherwise it is written while solving')
+        sys.exit(1)
+
+    # Solutions are written in the same format as the problem was given
+    data = read_input(args[0])
+    text = not is_binary(data, PROBLEM_MAGIC)
+    limit = int(args[2]) if len(args) > 2 else None
 
-    with open(sys.argv[2], 'w') as f:
-        lines = [' '.join(map(str, sol)) for sol in solutions]
-        f.writelines(map(lambda s: s + '\n', lines))
+    dl = DancingLinks(unpack_problem(data))
+    if checkpoint is None:
+        # Solutions are written as they are found instead of kept in memory
+        sink = SolutionWriter(args[1], text=text)
+        _, stats = dl.solve_with_stats(limit, sink=sink)
+        sink.close()
+        sys.stderr.write(stats.summary())
+    else:
+        sink = SolutionWriter(args[1], text=text)
+        if os.path.exists(checkpoint):
+            dl.resume(checkpoint, limit, sink=sink)
+        else:
+            dl.solve_with_checkpoints(checkpoint, limit, sink=sink)
+        sink.close()
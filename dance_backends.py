@@ -0,0 +1,132 @@
+"""Solve exact cover problems with the fastest solver available
+
+Each backend takes a problem, and optionally rows that every solution must
+contain, and returns the solutions as row key arrays.
+The Go and PyPy solvers run as subprocesses and the problem and solutions
+are streamed over their stdin and stdout in the binary format, so nothing
+is written to disk and concurrent solves cannot clash.
+"""
+
+import os
+import subprocess
+
+import dance
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def find_executable(name):
+    """Path of an executable on the PATH, or None"""
+    if os.path.dirname(name):
+        return name if os.path.isfile(name) and os.access(name, os.X_OK) else None
+
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+class PythonBackend(object):
+    """Solve in this process"""
+    name = 'python'
+
+    def __init__(self, engine=dance.DancingLinks):
+        self.engine = engine
+
+    def available(self):
+        return True
+
+    def solve(self, problem, limit=None, forced_rows=()):
+        return self.engine(problem, forced_rows=forced_rows).solve(limit)
+
+class SubprocessBackend(object):
+    """Solve with a command taking <problem> <solutions> [limit] arguments"""
+    def __init__(self, command):
+        self.command = command
+
+    def available(self):
+        return find_executable(self.command[0]) is not None
+
+    def solve(self, problem, limit=None, forced_rows=()):
+        solutions, _ = self.run(problem, limit, forced_rows)
+        return solutions
+
+    def run(self, problem, limit=None, forced_rows=()):
+        """Solutions and the statistics the solver wrote to stderr
+
+        The solvers only read version 1 problems, so ValueError is raised
+        for problems with secondary columns or colors.
+        """
+        problem = dance.as_sparse(problem)
+        if problem.n_secondary or dance.element_colors(problem) is not None:
+            raise ValueError('The %s solver does not support secondary columns' % self.name)
+        if len(forced_rows) > 0:
+            problem = dance.forced_problem(problem, forced_rows)
+
+        args = self.command + ['-', '-']
+        if limit is not None:
+            args.append(str(limit))
+
+        process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = process.communicate(dance.pack_problem(problem))
+        if process.returncode != 0:
+            raise RuntimeError('%s failed: %s' % (' '.join(args), err.decode().strip()))
+
+        return dance.unpack_solutions(out), err.decode()
+
+class GoBackend(SubprocessBackend):
+    """Solve with the compiled dance.go binary
+
+    A binary built next to this file is preferred over one on the PATH.
+    """
+    name = 'go'
+
+    def __init__(self, binary=None):
+        if binary is None:
+            binary = find_executable(os.path.join(here, 'dance')) or 'dance'
+        SubprocessBackend.__init__(self, [binary])
+
+class PypyBackend(SubprocessBackend):
+    """Solve with dance_pypy.py under PyPy
+
+    The script needs Python 3.  pypy3 is preferred over pypy, which is
+    PyPy 2.7 on most systems, and the interpreter is only available once it
+    has been checked to be Python 3.
+    """
+    name = 'pypy'
+
+    def __init__(self, pypy=None):
+        if pypy is None:
+            pypy = 'pypy3' if find_executable('pypy3') is not None else 'pypy'
+        script = os.path.join(here, 'dance_pypy.py')
+        SubprocessBackend.__init__(self, [pypy, script])
+        self.python3 = None
+
+    def available(self):
+        if self.python3 is None:
+            self.python3 = False
+            if SubprocessBackend.available(self):
+                check = 'import sys; sys.exit(sys.version_info[0] < 3)'
+                self.python3 = subprocess.call([self.command[0], '-c', check]) == 0
+        return self.python3
+
+# Fastest first
+backends = [GoBackend(), PypyBackend(), PythonBackend()]
+
+def available_backends():
+    return [b for b in backends if b.available()]
+
+def get_backend(name=None):
+    """Backend with the given name, or the fastest one available"""
+    for b in available_backends():
+        if name is None or b.name == name:
+            return b
+
+    raise ValueError('Backend %s is not available' % name)
+
+def solve(problem, limit=None, backend=None, forced_rows=()):
+    """Solutions of a problem, using the named or the fastest backend
+
+    Every solution contains the rows with keys in forced_rows.
+    """
+    return get_backend(backend).solve(problem, limit, forced_rows)
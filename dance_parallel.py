@@ -0,0 +1,205 @@
+"""Solve exact cover problems on several cores or machines
+
+The top levels of the search tree are expanded in the parent process, using
+the same column selection as a sequential search, and the subtree below each
+branch is searched by a process pool.  Results are merged back in the order
+of the branches, so they match a sequential search.
+
+For a batch cluster the branches can instead be written out as work unit
+files, each holding the row keys of one branch and of the forced rows.  A
+worker forces the rows and replays the prefix of a unit, searches the
+subtree below it and writes a result file, and the result files are merged
+once every unit has run.
+"""
+
+import multiprocessing
+import numpy as np
+import os
+import sys
+
+import dance
+
+worker = None
+
+def init_worker(matrix, engine, options):
+    global worker
+    worker = engine(matrix, **options)
+
+def solve_branch(prefix):
+    solutions = [worker.solution_keys(stack) for stack in worker.explore(prefix)]
+    return solutions, worker.nodes_searched
+
+def count_branch(prefix):
+    count = sum(1 for _ in worker.explore(prefix))
+    return count, worker.nodes_searched
+
+def order_branches(dl, branches, samples):
+    """Indices of the branches, largest estimated subtree first"""
+    sizes = [dl.estimate_tree_size(samples, prefix).nodes for prefix in branches]
+    return sorted(range(len(branches)), key=lambda i: -sizes[i])
+
+def map_branches(function, matrix, levels, processes, engine, options, samples=0):
+    """Split the search tree and map function over the branches in order
+
+    Returns the results for each branch and the total number of nodes
+    searched, including the nodes expanded to split the tree.  With samples
+    the size of each branch is estimated first and the largest ones are
+    handed out first, so the workers finish at about the same time.
+    """
+    dl = engine(matrix, **options)
+    branches = dl.split(levels)
+    nodes_searched = dl.nodes_searched
+
+    order = list(range(len(branches)))
+    if samples:
+        order = order_branches(dl, branches, samples)
+
+    pool = multiprocessing.Pool(processes, init_worker, (matrix, engine, options))
+    try:
+        results = [None] * len(branches)
+        ordered = pool.imap(function, [branches[i] for i in order])
+        for i, (result, nodes) in zip(order, ordered):
+            results[i] = result
+            nodes_searched += nodes
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return results, nodes_searched
+
+def parallel_solutions(matrix, levels=2, processes=None,
+                       engine=dance.DancingLinks, samples=0, **options):
+    """All solutions, in the order a sequential search would find them"""
+    results, _ = map_branches(solve_branch, matrix, levels, processes,
+                              engine, options, samples)
+    return [s for solutions in results for s in solutions]
+
+def parallel_count(matrix, levels=2, processes=None,
+                   engine=dance.DancingLinks, samples=0, **options):
+    """Number of solutions, without building any of them"""
+    results, _ = map_branches(count_branch, matrix, levels, processes,
+                              engine, options, samples)
+    return sum(results)
+
+def save_rows(f, rows):
+    lines = [' '.join(map(str, row)) for row in rows]
+    f.writelines(map(lambda s: s + '\n', lines))
+
+def load_rows(f):
+    return [np.array(line.split(), dtype=int) for line in f]
+
+def export_work_units(matrix, levels, directory, engine=dance.DancingLinks,
+                      **options):
+    """Write the problem and one work unit per branch to a directory
+
+    A unit holds the row keys of its branch on the first line and those of
+    the forced rows on the second, so it can be run without the options.
+    Returns the unit filenames, in the order their results should be merged.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    dance.save_problem(os.path.join(directory, 'problem'), matrix,
+                       n_secondary=options.get('n_secondary'))
+
+    dl = engine(matrix, **options)
+    forced = dl.forced_keys()
+    units = []
+    for i, prefix in enumerate(dl.split(levels)):
+        filename = os.path.join(directory, 'unit_%06d' % i)
+        with open(filename, 'w') as f:
+            save_rows(f, [prefix, forced])
+        units.append(filename)
+
+    return units
+
+def run_work_unit(problem, unit, result, count_only=False,
+                  engine=dance.DancingLinks, **options):
+    """Search the subtree below one work unit and write its result file
+
+    The first line of the result holds the number of solutions and nodes
+    searched, followed by one line per solution unless count_only is set.
+    """
+    dl = engine(dance.load_problem(problem), **options)
+    with open(unit) as f:
+        rows = load_rows(f)
+    prefix = rows[0]
+    if len(rows) > 1:
+        dl.force_rows(rows[1].tolist())
+
+    count = 0
+    solutions = []
+    for stack in dl.explore(prefix.tolist()):
+        count += 1
+        if not count_only:
+            solutions.append(dl.solution_keys(stack))
+
+    with open(result, 'w') as f:
+        save_rows(f, [[count, dl.nodes_searched]] + solutions)
+
+def merge_results(results):
+    """Combine result files into a count, nodes searched and solutions
+
+    The nodes searched are those below the work units, not the ones expanded
+    to split the tree.  The solutions are returned in the order of the result
+    files given.
+    """
+    count = 0
+    nodes_searched = 0
+    solutions = []
+
+    for filename in results:
+        with open(filename) as f:
+            rows = load_rows(f)
+        count += rows[0][0]
+        nodes_searched += rows[0][1]
+        solutions.extend(rows[1:])
+
+    return count, nodes_searched, solutions
+
+def usage():
+    print('Usage: %s solve <problem input> <solution output> [levels] [processes]' % sys.argv[0])
+    print('       %s split <problem input> <unit directory> [levels]' % sys.argv[0])
+    print('       %s run <problem> <unit> <result output> [--count]' % sys.argv[0])
+    print('       %s merge <solution output> <result>...' % sys.argv[0])
+    sys.exit(1)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        usage()
+
+    command = sys.argv[1]
+    args = sys.argv[2:]
+
+    if command == 'solve':
+        levels = int(args[2]) if len(args) > 2 else 2
+        processes = int(args[3]) if len(args) > 3 else None
+
+        mat = dance.load_problem(args[0])
+        solutions = parallel_solutions(mat, levels, processes)
+        print('Solutions found: %d' % len(solutions))
+
+        with open(args[1], 'w') as f:
+            save_rows(f, solutions)
+
+    elif command == 'split':
+        levels = int(args[2]) if len(args) > 2 else 2
+
+        units = export_work_units(dance.load_problem(args[0]), levels, args[1])
+        print('Work units written: %d' % len(units))
+
+    elif command == 'run':
+        if len(args) < 3:
+            usage()
+        run_work_unit(args[0], args[1], args[2], count_only='--count' in args[3:])
+
+    elif command == 'merge':
+        count, nodes_searched, solutions = merge_results(args[1:])
+        print('Nodes searched: %d' % nodes_searched)
+        print('Solutions found: %d' % count)
+
+        with open(args[0], 'w') as f:
+            save_rows(f, solutions)
+
+    else:
+        usage()
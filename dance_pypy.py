@@ -1,7 +1,17 @@
-import numpypy as np
+import array
+import struct
 import sys
 import time
 
+clock = getattr(time, 'perf_counter', None) or time.clock
+
+# Binary problem and solution files, see the format description in dance.py
+PROBLEM_MAGIC = b'DLXP'
+SOLUTION_MAGIC = b'DLXS'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sIqqq')
+
 class Node(object):
     def __init__(self, key=None):
         self.key = key
@@ -25,6 +35,17 @@ class DancingLinks(object):
 
         self.use_greedy_column_selection = use_greedy_column_selection
 
+    @classmethod
+    def from_rows(cls, rows, n_columns, use_greedy_column_selection=True):
+        """Build from a list with the column indices of each row"""
+        dl = cls.__new__(cls)
+        dl.build_empty_columns(n_columns)
+        for i, columns in enumerate(rows):
+            dl.insert_columns(columns, i)
+
+        dl.use_greedy_column_selection = use_greedy_column_selection
+        return dl
+
     def build_empty_columns(self, n_columns):
         """Build an empty dancing links structure with given # of columns"""
         self.head = Node()
@@ -58,19 +79,22 @@ class DancingLinks(object):
 
     def insert_row(self, row, key):
         """Insert the marker for every non-zero element"""
+        self.insert_columns([i for i, v in enumerate(row) if v], key)
+
+    def insert_columns(self, columns, key):
+        """Insert a row with elements in the given columns"""
         current = None
         first = None
 
-        for i, v in enumerate(row):
-            if v:
-                node = self.insert_single_element(i, key)
+        for i in columns:
+            node = self.insert_single_element(i, key)
 
-                if current:
-                    current.R = node
-                    node.L = current
-                else:
-                    first = node
-                current = node
+            if current:
+                current.R = node
+                node.L = current
+            else:
+                first = node
+            current = node
 
         if current:
             current.R = first
@@ -108,7 +132,7 @@ class DancingLinks(object):
         if not self.use_greedy_column_selection:
             return self.head.R
 
-        best_size = sys.maxint
+        best_size = sys.maxsize
         best_c = None
 
         c = self.head.R
@@ -122,7 +146,7 @@ class DancingLinks(object):
 
     def search(self):
         if self.head.R == self.head:
-            self.all_solutions.append(np.array(self.solution))
+            self.all_solutions.append(list(self.solution))
             return
 
         c = self.select_column()
@@ -142,34 +166,140 @@ class DancingLinks(object):
                 self.uncover(j.C)
                 j = j.L
             self.solution.pop()
+            if self.limit_reached():
+                break
             r = r.D
         self.uncover(c)
 
-    def generate_all_solutions(self):
+    def limit_reached(self):
+        return self.limit is not None and len(self.all_solutions) >= self.limit
+
+    def generate_all_solutions(self, limit=None):
         self.solution = []
         self.all_solutions = []
         self.nodes_searched = 0
+        self.limit = limit
 
-        start = time.clock()
-        self.search()
-        end = time.clock()
-
-        print('Nodes searched: %d' % self.nodes_searched)
-        print('Solutions found: %d' % len(self.all_solutions))
-        print('Time elapsed: %f' % (end - start))
+        start = clock()
+        if not self.limit_reached():
+            self.search()
+        end = clock()
+
+        sys.stderr.write('Nodes searched: %d\n' % self.nodes_searched)
+        sys.stderr.write('Solutions found: %d\n' % len(self.all_solutions))
+        sys.stderr.write('Time elapsed: %f\n' % (end - start))
+        rss = peak_rss()
+        if rss is not None:
+            sys.stderr.write('Peak RSS: %d kB\n' % rss)
         return self.all_solutions
 
-def load_problem(filename):
-    f = open(filename)
-
-    data = [[int(v) for v in line.split(" ")] for line in f]
+def peak_rss():
+    """Peak resident memory in kB from /proc/self/status, or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+def read_input(filename):
+    """Contents of a file, or of stdin for '-'"""
+    if filename == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin).read()
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def write_output(filename, data):
+    """Write bytes to a file, or to stdout for '-'"""
+    if filename == '-':
+        out = getattr(sys.stdout, 'buffer', sys.stdout)
+        out.write(data)
+        out.flush()
+    else:
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+def parse_problem(data):
+    """Dense problem from text data
+
+    numpy is only needed here, the binary problems the backends send are
+    parsed without it.  Older PyPy releases ship it as numpypy.
+    """
+    try:
+        import numpypy as np
+    except ImportError:
+        import numpy as np
+
+    lines = data.decode().splitlines()
+    data = [[int(v) for v in line.split(" ")] for line in lines if line]
     return np.array(data, dtype=bool)
 
-if __name__ == '__main__':
-    mat = load_problem(sys.argv[1])
-    dl = DancingLinks(mat)
-    solutions = dl.generate_all_solutions()
+def load_problem(filename):
+    return parse_problem(read_input(filename))
+
+def is_binary(data, magic):
+    return data[:len(magic)] == magic
+
+def parse_binary_problem(data):
+    """Column indices of each row and the number of columns of a problem"""
+    magic, version, n_rows, n_columns, nnz = HEADER.unpack_from(data)
+    if magic != PROBLEM_MAGIC or version != FORMAT_VERSION:
+        raise ValueError('Not a supported binary problem')
+
+    offset = HEADER.size
+    indptr = array.array('q')
+    indptr.frombytes(data[offset:offset + 8 * (n_rows + 1)])
+    offset += 8 * (n_rows + 1)
+    indices = array.array('i')
+    indices.frombytes(data[offset:offset + 4 * nnz])
+
+    if sys.byteorder == 'big':
+        indptr.byteswap()
+        indices.byteswap()
+
+    rows = [indices[indptr[i]:indptr[i+1]] for i in range(n_rows)]
+    return rows, n_columns
+
+def pack_solutions(solutions):
+    indptr = array.array('q', [0])
+    keys = array.array('i')
+    for sol in solutions:
+        keys.extend(sol)
+        indptr.append(len(keys))
+
+    if sys.byteorder == 'big':
+        indptr.byteswap()
+        keys.byteswap()
+
+    header = HEADER.pack(SOLUTION_MAGIC, FORMAT_VERSION, len(solutions), 0,
+                         len(keys))
+    return header + indptr.tobytes() + keys.tobytes()
 
-    with open(sys.argv[2], 'w') as f:
-        lines = [' '.join(map(str, sol)) for sol in solutions]
-        f.writelines(map(lambda s: s + '\n', lines))
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: %s <problem input> <solution output> [limit]' % sys.argv[0])
+        print('Use - to read the problem from stdin or write solutions to stdout')
+        sys.exit(1)
+
+    # Solutions are written in the same format as the problem was given
+    data = read_input(sys.argv[1])
+    binary = is_binary(data, PROBLEM_MAGIC)
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    if limit is not None and limit < 0:
+        sys.stderr.write('Limit must not be negative\n')
+        sys.exit(1)
+
+    if binary:
+        rows, n_columns = parse_binary_problem(data)
+        dl = DancingLinks.from_rows(rows, n_columns)
+    else:
+        dl = DancingLinks(parse_problem(data))
+    solutions = dl.generate_all_solutions(limit)
+
+    if binary:
+        write_output(sys.argv[2], pack_solutions(solutions))
+    else:
+        lines = [' '.join(map(str, sol)) + '\n' for sol in solutions]
+        write_output(sys.argv[2], ''.join(lines).encode())
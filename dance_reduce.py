@@ -0,0 +1,181 @@
+"""Shrink exact cover problems before searching them
+
+The reductions are repeated until none of them changes the problem:
+
+- rows without primary columns, and all but the first of identical rows,
+  are removed
+- a primary column with a single row forces that row: the row, its columns
+  and every row clashing with it are removed
+- rows clashing with every row of some primary column are removed, they
+  would leave that column uncoverable
+- identical columns are merged, and secondary columns with at most one row
+  are removed
+
+Every row of the reduced problem stands for a group of identical original
+rows, so its solutions translate back to one or all original solutions.
+"""
+
+import itertools
+import numpy as np
+
+import dance
+
+class Reduction(object):
+    """A reduced problem and the mapping back to the original one
+
+    matrix is the reduced problem, with the n_secondary secondary columns
+    last.  Row k of it stands for the original rows row_keys[k], the first
+    of them identical to the others.  forced holds the groups of original
+    rows in every solution, and columns[j] the original columns merged into
+    column j.  If infeasible a primary column has no rows left, so the
+    problem has no solutions.
+    """
+    def __init__(self, matrix, n_secondary, row_keys, columns, forced, infeasible):
+        self.matrix = matrix
+        self.n_secondary = n_secondary
+        self.row_keys = row_keys
+        self.columns = columns
+        self.forced = forced
+        self.infeasible = infeasible
+
+    def original_solution(self, solution):
+        """Original row keys of a solution, the forced rows first"""
+        groups = self.forced + [self.row_keys[k] for k in solution]
+        return np.array([g[0] for g in groups], dtype=int)
+
+    def expand_solutions(self, solutions):
+        """Generate every original solution, choosing among identical rows"""
+        for solution in solutions:
+            groups = self.forced + [self.row_keys[k] for k in solution]
+            for keys in itertools.product(*groups):
+                yield np.array(keys, dtype=int)
+
+    def count(self, solutions):
+        """Number of original solutions the reduced solutions stand for"""
+        forced = int(np.prod([len(g) for g in self.forced]))
+        return sum(forced * int(np.prod([len(self.row_keys[k]) for k in s]))
+                   for s in solutions)
+
+def reduce_problem(matrix, n_secondary=0):
+    """Reduce a problem, see the module description, returning a Reduction"""
+    matrix = dance.as_sparse(matrix)
+    if dance.element_colors(matrix, n_secondary) is not None:
+        raise ValueError('Problems with colors cannot be reduced')
+
+    n_columns = matrix.shape[1]
+    n_primary = n_columns - n_secondary
+
+    rows = {}
+    for key in range(matrix.shape[0]):
+        row = frozenset(matrix.row(key).tolist())
+        if row:
+            rows[key] = row
+
+    columns = dict((c, set()) for c in range(n_columns))
+    for key, row in rows.items():
+        for c in row:
+            columns[c].add(key)
+
+    groups = dict((key, [key]) for key in rows)
+    merged = dict((c, [c]) for c in range(n_columns))
+    forced = []
+
+    def remove_row(key):
+        for c in rows.pop(key):
+            columns[c].discard(key)
+
+    def remove_column(c):
+        for key in columns.pop(c):
+            rows[key] = rows[key] - set([c])
+
+    infeasible = False
+    changed = True
+    while changed and not infeasible:
+        changed = False
+
+        # Identical rows
+        first = {}
+        for key in sorted(rows):
+            row = rows[key]
+            if not row or min(row) >= n_primary:
+                remove_row(key)
+                changed = True
+            elif row in first:
+                groups[first[row]].extend(groups[key])
+                remove_row(key)
+                changed = True
+            else:
+                first[row] = key
+
+        # Forced rows
+        for c in range(n_primary):
+            if c not in columns:
+                continue
+            if len(columns[c]) == 0:
+                infeasible = True
+                break
+            if len(columns[c]) == 1:
+                key = next(iter(columns[c]))
+                row = rows[key]
+                clashing = set().union(*[columns[d] for d in row])
+                for other in clashing:
+                    remove_row(other)
+                for d in row:
+                    remove_column(d)
+                forced.append(groups[key])
+                changed = True
+        if infeasible:
+            break
+
+        # Rows that leave a column uncoverable
+        neighbours = dict((key, set().union(*[columns[c] for c in row]))
+                          for key, row in rows.items())
+        for c in range(n_primary):
+            if c not in columns or not columns[c]:
+                continue
+            blocked = set.intersection(*[neighbours[key] for key in columns[c]])
+            blocked -= columns[c]
+            for key in blocked:
+                if key in rows:
+                    remove_row(key)
+                    changed = True
+
+        # Identical and unneeded columns, primary ones are kept first
+        first = {}
+        for c in sorted(columns):
+            column = frozenset(columns[c])
+            if c >= n_primary and len(column) <= 1:
+                remove_column(c)
+                changed = True
+            elif column and column in first:
+                merged[first[column]].extend(merged[c])
+                remove_column(c)
+                changed = True
+            elif column:
+                first[column] = c
+
+    kept_rows = sorted(rows)
+    kept_columns = sorted(columns)
+    index = dict((c, j) for j, c in enumerate(kept_columns))
+
+    reduced = dance.SparseMatrix.from_rows([[index[c] for c in rows[key]] for key in kept_rows],
+                                           len(kept_columns))
+    return Reduction(reduced,
+                     sum(1 for c in kept_columns if c >= n_primary),
+                     [groups[key] for key in kept_rows],
+                     [merged[c] for c in kept_columns],
+                     forced,
+                     infeasible)
+
+def solve(matrix, limit=None, n_secondary=0, engine=dance.DancingLinks):
+    """Solutions of a problem in original row keys, found on its reduction
+
+    With identical rows each reduced solution stands for several original
+    ones, use Reduction.expand_solutions to get all of them.
+    """
+    reduction = reduce_problem(matrix, n_secondary)
+    if reduction.infeasible:
+        return []
+
+    dl = engine(reduction.matrix, n_secondary=reduction.n_secondary)
+    return [reduction.original_solution(s) for s in dl.solve(limit)]
@@ -1,15 +1,25 @@
 import matplotlib.cm
 import matplotlib.pyplot
 import numpy as np
-import os
+from numpy.lib.stride_tricks import sliding_window_view
+
+import dance
+import dance_backends
 
 class Piece(object):
     def __init__(self, letter, mask):
         self.letter = letter
         self.mask = mask.astype(np.bool)
         self.color = (1.0, 1.0, 1.0, 1.0)
+        self._rotations = None
 
     def unique_rotations(self):
+        """Distinct orientations of the piece, computed once"""
+        if self._rotations is None:
+            self._rotations = self.compute_unique_rotations()
+        return self._rotations
+
+    def compute_unique_rotations(self):
         unique = [self.mask]
 
         for r in [0, 1, 2, 3]:
@@ -28,13 +38,17 @@ class Piece(object):
         return unique
 
     def rotation(self, r, f):
-        rotated = self.mask
-        for i in range(r):
-            rotated = np.rot90(rotated)
+        return transform(self.mask, r, f)
 
-        if f:
-            rotated = np.fliplr(rotated)
-        return rotated
+def transform(array, r, f):
+    """Rotate an array r quarter turns and then flip it if f"""
+    rotated = array
+    for i in range(r):
+        rotated = np.rot90(rotated)
+
+    if f:
+        rotated = np.fliplr(rotated)
+    return rotated
 
 pieces = [Piece('P', np.array([[1, 1],
                                [1, 1],
@@ -88,30 +102,28 @@ boards['hollow_chess_board'] = np.array([[1, 1, 1, 1, 1, 1, 1, 1],
                                         [1, 1, 1, 1, 1, 1, 1, 1]],
                                        dtype=np.bool)
 
-def is_valid_location(board, mask, location):
-    i, j = location
-    di, dj = mask.shape
+def valid_location_arrays(board, mask):
+    """Rows and columns of every location where mask fits on the board
 
-    subboard = board[i:i+di, j:j+dj]
-    if subboard.shape == mask.shape and np.array_equal(mask, mask & subboard):
-        return True
-    else:
-        return False
+    All windows of the board are compared against the mask at once.
+    """
+    if mask.shape[0] > board.shape[0] or mask.shape[1] > board.shape[1]:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
 
-def valid_locations(board, mask):
-    locations = [(i,j) for i in range(board.shape[0]) for j in range(board.shape[1])]
-    return filter(lambda loc: is_valid_location(board, mask, loc), locations)
+    windows = sliding_window_view(board.astype(np.bool), mask.shape)
+    fits = ~np.any(mask & ~windows, axis=(2, 3))
+    return np.nonzero(fits)
 
-def fill_in_row(row, piece_index, mask, location, column_map):
-    i, j = location
+def valid_locations(board, mask):
+    return list(zip(*[a.tolist() for a in valid_location_arrays(board, mask)]))
 
-    row[piece_index] = True
-    for r, mr in enumerate(mask):
-        for c, v in enumerate(mr):
-            if v:
-                row[column_map[i+r, j+c]] = True
+def placements(board):
+    """Exact cover problem and row labels for tiling board with the pieces
 
-def exact_cover_problem(board):
+    Rows are ordered by piece, orientation and location.  Each orientation
+    adds a block of rows with the piece column followed by the board
+    columns of its squares, which are already in increasing order.
+    """
     n_piece_columns = len(pieces)
     n_space_columns = np.nonzero(board)[0].size
 
@@ -119,57 +131,161 @@ def exact_cover_problem(board):
 
     column_map = np.cumsum(board).reshape(board.shape) + n_piece_columns - 1
 
-    rows = []
-    row_labels = []
-    for piece_index, piece in enumerate(pieces):
-        for mask in piece.unique_rotations():
-            for location in valid_locations(board, mask):
-                row = np.zeros(n_columns, dtype=np.bool)
-                fill_in_row(row, piece_index, mask, location, column_map)
-                rows.append(row)
-
-    return np.array(rows, dtype=np.bool)
-
-def exact_cover_row_labels(board):
+    blocks = []
+    lengths = []
     labels = []
     for piece_index, piece in enumerate(pieces):
         for mask_index, mask in enumerate(piece.unique_rotations()):
-            for location in valid_locations(board, mask):
-                labels.append((piece.letter, piece_index, mask_index, location))
+            i, j = valid_location_arrays(board, mask)
+            di, dj = np.nonzero(mask)
+
+            squares = column_map[i[:, np.newaxis] + di, j[:, np.newaxis] + dj]
+            piece_column = np.full((i.size, 1), piece_index)
+            blocks.append(np.hstack([piece_column, squares]).ravel())
+            lengths.append(np.full(i.size, 1 + di.size))
+
+            labels.extend((piece.letter, piece_index, mask_index, location)
+                          for location in zip(i.tolist(), j.tolist()))
+
+    indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(lengths), out=indptr[1:])
+    mat = dance.SparseMatrix(indptr, np.concatenate(blocks), (len(labels), n_columns))
+
+    return mat, labels
+
+def exact_cover_problem(board, sparse=False):
+    """Exact cover problem for tiling board with the pieces
+
+    With sparse the problem is returned as a dance.SparseMatrix.
+    """
+    mat, _ = placements(board)
 
+    if sparse:
+        return mat
+    return mat.toarray()
+
+def exact_cover_row_labels(board):
+    _, labels = placements(board)
     return labels
 
 def simplified_chess_board_problems():
-    base = exact_cover_problem(boards['hollow_chess_board'])
-    labels = exact_cover_row_labels(boards['hollow_chess_board'])
-    n_columns = base.shape[1]
-
-    # Generate the 'X at 23' problem
-    mask = np.array([l[0] == 'X' and l[3] != (0,1) for l in labels], dtype=np.bool)
-    base_0 = base.copy()
-    base_0[mask, :] = 0
-
-    # Generate the 'X at 24' problem
-    mask = np.array([l[0] == 'X' and l[3] != (0,2) for l in labels], dtype=np.bool)
-    base_1 = base.copy()
-    base_1[mask, :] = 0
-
-    # Generate the 'X at 33, P not flipped' problem
-    xmask = np.array([l[0] == 'X' and l[3] != (1,1) for l in labels], dtype=np.bool)
+    """The hollow chess board split into three problems by the position of X
+
+    Returns (problem, forced_rows) pairs.  The placement of X is forced
+    instead of masking out its other rows, so the first two problems share
+    the base matrix.  symmetry_reduced_problem removes the symmetric
+    solutions of any board without hand written masks.
+    """
+    board = boards['hollow_chess_board']
+    base, labels = placements(board)
+
+    def x_at(location):
+        return [i for i, l in enumerate(labels) if l[0] == 'X' and l[3] == location]
+
+    # The 'X at 33' problem also needs P not flipped
     pmask = np.array([l[0] == 'P' and l[2] in [0,2,4,6] for l in labels], dtype=np.bool)
-    base_2 = base.copy()
-    base_2[xmask, :] = 0
-    base_2[pmask, :] = 0
+    base_2 = base.empty_rows(pmask)
+
+    return [(base, x_at((0,1))),
+            (base, x_at((0,2))),
+            (base_2, x_at((1,1)))]
+
+def board_symmetries(board):
+    """Rotations and flips (r, f) that leave the board unchanged
+
+    The identity (0, 0) comes first.
+    """
+    symmetries = []
+    for r in [0, 1, 2, 3]:
+        for f in [0, 1]:
+            transformed = transform(board, r, f)
+            if transformed.shape == board.shape and np.array_equal(transformed, board):
+                symmetries.append((r, f))
+
+    return symmetries
+
+def placement_permutations(board, mat, symmetries):
+    """Row key of the image of every placement under each symmetry"""
+    board = board.astype(np.bool)
+    column_map = np.cumsum(board).reshape(board.shape) + len(pieces) - 1
+    cells = np.arange(board.size).reshape(board.shape)
+
+    keys = {}
+    for key in range(mat.shape[0]):
+        keys[tuple(mat.row(key).tolist())] = key
+
+    permutations = []
+    for r, f in symmetries:
+        # The square at transformed[a, b] moves to (a, b)
+        transformed = transform(cells, r, f)
+        column_perm = np.arange(mat.shape[1])
+        column_perm[column_map.ravel()[transformed[board]]] = column_map[board]
+
+        perm = np.empty(mat.shape[0], dtype=int)
+        for key in range(mat.shape[0]):
+            perm[key] = keys[tuple(sorted(column_perm[mat.row(key)].tolist()))]
+        permutations.append(perm)
+
+    return permutations
+
+def symmetry_reduced_problem(board, sparse=False):
+    """Exact cover problem with the symmetric copies of solutions removed
+
+    The placements of one piece are restricted to one per orbit under the
+    symmetries of the board.  The piece must have no placement that a
+    symmetry maps onto itself, so every solution of the full problem is the
+    image of exactly one solution of the reduced problem.  The fewest
+    placements of such a piece are kept, and if there is none the problem
+    is not reduced.
+
+    Rows keep their keys from exact_cover_problem, with the removed ones
+    left empty.  Returns the problem and the placement permutations of the
+    symmetries, for expand_solutions.
+    """
+    mat, labels = placements(board)
+    permutations = placement_permutations(board, mat, board_symmetries(board))
+    images = np.array(permutations)
+    piece_of_row = np.array([l[1] for l in labels], dtype=int)
+    keys = np.arange(mat.shape[0])
+
+    best = None
+    for piece_index in range(len(pieces)):
+        rows = keys[piece_of_row == piece_index]
+        if len(permutations) == 1 or np.any(images[1:, rows] == rows):
+            continue
+
+        kept = rows[rows == images[:, rows].min(axis=0)]
+        if best is None or kept.size < best[1].size:
+            best = rows, kept
+
+    keep = np.ones(mat.shape[0], dtype=np.bool)
+    if best is not None:
+        keep[best[0]] = False
+        keep[best[1]] = True
+    else:
+        permutations = permutations[:1]
 
-    return base_0, base_1, base_2
+    reduced = mat.empty_rows(~keep)
 
-def load_solution(filename):
-    solution = []
-    with open(filename) as f:
-        for line in f:
-            solution.append(np.fromstring(line, dtype=np.int, sep=' '))
+    if not sparse:
+        reduced = reduced.toarray()
+    return reduced, permutations
+
+def expand_solutions(solutions, permutations):
+    """Every distinct image of the solutions under the symmetries"""
+    seen = set()
+    expanded = []
+    for solution in solutions:
+        for perm in permutations:
+            image = np.sort(perm[np.asarray(solution, dtype=int)])
+            if tuple(image) not in seen:
+                seen.add(tuple(image))
+                expanded.append(image)
 
-    return solution
+    return expanded
+
+def load_solution(filename):
+    return dance.load_solutions(filename)
 
 def display_solution(board, solution):
     colored = np.zeros((board.shape[0], board.shape[1], 4))
@@ -183,40 +299,21 @@ def display_solution(board, solution):
         color = matplotlib.cm.rainbow(piece_index / float(len(pieces)))
 
         mask = pieces[piece_index].unique_rotations()[mask_index]
-        for r, mr in enumerate(mask):
-            for c, v in enumerate(mr):
-                if v:
-                    colored[i+r, j+c] = color
+        colored[i:i+mask.shape[0], j:j+mask.shape[1]][mask] = color
 
     matplotlib.pyplot.figure()
     matplotlib.pyplot.imshow(colored, interpolation='nearest')
     matplotlib.pyplot.axis('off')
 
 if __name__ == '__main__':
-    P1, P2, P3 = simplified_chess_board_problems()
-
-    print('Saving subproblems...')
-    np.savetxt('sub_problem_1', P1.astype(np.int), fmt='%r')
-    np.savetxt('sub_problem_2', P2.astype(np.int), fmt='%r')
-    np.savetxt('sub_problem_3', P3.astype(np.int), fmt='%r')
-
-    print('Solving subproblem 1...')
-    os.spawnl(os.P_WAIT, 'dance', 'dance', 'sub_problem_1', 'solution_1')
+    backend = dance_backends.get_backend()
 
-    print('Solving subproblem 2...')
-    os.spawnl(os.P_WAIT, 'dance', 'dance', 'sub_problem_2', 'solution_2')
-
-    print('Solving subproblem 3...')
-    os.spawnl(os.P_WAIT, 'dance', 'dance', 'sub_problem_3', 'solution_3')
+    print('Solving subproblems with the %s backend...' % backend.name)
+    solutions = [backend.solve(P, limit=1, forced_rows=forced)
+                 for P, forced in simplified_chess_board_problems()]
 
     print('Displaying first solution from each')
-    solution_1 = load_solution('solution_1')
-    display_solution(boards['hollow_chess_board'], solution_1[0])
-
-    solution_2 = load_solution('solution_2')
-    display_solution(boards['hollow_chess_board'], solution_2[0])
-
-    solution_3 = load_solution('solution_3')
-    display_solution(boards['hollow_chess_board'], solution_3[0])
+    for solution in solutions:
+        display_solution(boards['hollow_chess_board'], solution[0])
 
     matplotlib.pyplot.show()
@@ -1,8 +1,9 @@
 import numpy as np
-import os
-import string
 import sys
 
+import dance
+import dance_backends
+
 def exact_cover_labels(K):
     labels = []
     for n in range(K):
@@ -12,89 +13,143 @@ def exact_cover_labels(K):
 
     return labels
 
-def full_exact_cover_problem(K):
-    mat = np.zeros((K*K*K, 3*K*K + K*K), dtype=np.bool)
+def label_arrays(K):
+    """Number, row and column of every exact cover row, as in the labels"""
+    n, r, c = np.meshgrid(np.arange(K), np.arange(K), np.arange(K), indexing='ij')
+    return n.ravel() + 1, r.ravel(), c.ravel()
+
+def exact_cover_columns(K):
+    """K^3 x 4 array with the columns of every row of the full problem"""
+    k = int(np.sqrt(K))
+    if k * k != K:
+        raise ValueError('Board size must be a square number')
+
+    n, r, c = label_arrays(K)
+    n = n - 1
+    box = (r // k) * k + c // k
+
+    # One column for each number being in each row, column, box and one
+    # column for each square => 1 entry per square
+    return np.stack([r * K + n,
+                     c * K + n + K*K,
+                     box * K + n + 2*K*K,
+                     r * K + c + 3*K*K], axis=1)
+
+def problem_for_rows(K, columns, keep, sparse):
+    """Exact cover problem with only the kept rows filled in"""
+    indptr = np.zeros(K**3 + 1, dtype=np.int64)
+    np.cumsum(np.where(keep, 4, 0), out=indptr[1:])
+
+    mat = dance.SparseMatrix(indptr, columns[keep].ravel(), (K**3, 4*K*K))
+
+    if sparse:
+        return mat
+    return mat.toarray()
+
+def full_exact_cover_problem(K, sparse=False):
+    return problem_for_rows(K, exact_cover_columns(K), np.ones(K**3, dtype=bool), sparse)
+
+def exact_cover_problem(board, sparse=False):
+    """Exact cover problem for a board, with 0 for the empty squares
+
+    Rows for other numbers in the squares of the clues are left empty, so
+    the row keys stay the same as in the full problem.  With sparse the
+    problem is returned as a dance.SparseMatrix.
+    """
+    if board.ndim != 2 or board.shape[0] != board.shape[1]:
+        raise ValueError('Incorrect board shape, expected square board')
 
-    k = np.sqrt(K)
-    boxes = np.arange(K).reshape((k,k))
-    boxes = np.repeat(np.repeat(boxes, k, axis=0), k, axis=1)
+    return exact_cover_problems(board[np.newaxis], sparse)[0]
 
-    # One column for each number being in each row, column, box
-    row_columns = np.arange(K) * K
-    col_columns = np.arange(K) * K + K*K
-    box_columns = np.arange(K) * K + 2*K*K
+def exact_cover_problems(boards, sparse=False):
+    """Exact cover problems for an N x K x K batch of boards
 
-    # One column for each square => 1 entry per square
-    sqr_columns = np.arange(K*K).reshape((K,K)) + 3*K*K
+    The rows ruled out by the clues of every board are found at once.
+    """
+    boards = np.asarray(boards)
+    if boards.ndim != 3 or boards.shape[1] != boards.shape[2]:
+        raise ValueError('Incorrect boards shape, expected N x K x K')
+    K = boards.shape[1]
 
-    i = 0
-    for n in range(K):
-        for r in range(K):
-            for c in range(K):
-                row_idx = row_columns[r] + n
-                col_idx = col_columns[c] + n
-                box_idx = box_columns[boxes[r,c]] + n
-                sqr_idx = sqr_columns[r,c]
+    columns = exact_cover_columns(K)
+    n, r, c = label_arrays(K)
 
-                mat[i, row_idx] = 1
-                mat[i, col_idx] = 1
-                mat[i, box_idx] = 1
-                mat[i, sqr_idx] = 1
-                i += 1
+    clues = boards[:, r, c]
+    keep = (clues == 0) | (clues == n)
 
-    return mat
+    return [problem_for_rows(K, columns, k, sparse) for k in keep]
 
-def exact_cover_problem(board):
-    if board.shape[0] != board.shape[1]:
-        raise ValueError('Incorrect board shape, expected square board')
+def clue_rows(board):
+    """Row keys of the full exact cover problem for the clues of a board"""
     K = board.shape[0]
-
-    mat = full_exact_cover_problem(K)
-    labels = exact_cover_labels(K)
-
-    for r in range(K):
-        for c in range(K):
-            if board[r, c] > 0:
-                n = board[r, c]
-                mask = np.array([l[0] != n and l[1] == r and l[2] == c for l in labels], dtype=np.bool)
-                mat[mask, :] = 0
-
-    return mat
+    r, c = np.nonzero(board)
+    return ((board[r, c] - 1) * K*K + r * K + c).tolist()
+
+class SudokuSolver(object):
+    """Solve many K x K boards with one dancing links structure
+
+    The full exact cover problem is built once.  The clues of each board
+    are forced, the search runs and the clues are released again, which
+    leaves the structure as built for the next board.
+    """
+    def __init__(self, K, engine=dance.DancingLinks):
+        self.K = K
+        self.dl = engine(full_exact_cover_problem(K, sparse=True))
+
+    def solutions(self, board, limit=2):
+        """Up to limit solutions of a board, as exact cover row keys"""
+        if board.shape != (self.K, self.K):
+            raise ValueError('Incorrect board shape, expected %dx%d board' % (self.K, self.K))
+
+        try:
+            self.dl.force_rows(clue_rows(board))
+            return self.dl.solve(limit)
+        except ValueError:
+            # Clues that clash leave the board without solutions
+            return []
+        finally:
+            self.dl.release_rows()
+
+    def solve(self, board):
+        """Solved board, or None, and whether the solution is unique"""
+        solutions = self.solutions(board, limit=2)
+        if len(solutions) == 0:
+            return None, False
+
+        return board_for_solution(solutions[0], self.K), len(solutions) == 1
+
+    def solve_many(self, boards):
+        """Generate the result of solve for each board in turn"""
+        for board in boards:
+            yield self.solve(board)
 
 def load_solution(filename):
-    solution = []
-    with open(filename) as f:
-        for line in f:
-            solution.append(np.fromstring(line, dtype=np.int, sep=' '))
-
-    return solution
+    return dance.load_solutions(filename)
 
 def board_for_solution(solution, K):
-    board = np.zeros((K,K), dtype=np.int)
-    labels = exact_cover_labels(K)
-
-    for row in solution:
-        n = labels[row][0]
-        r = labels[row][1]
-        c = labels[row][2]
+    board = np.zeros((K,K), dtype=int)
 
-        board[r][c] = n
+    solution = np.asarray(solution, dtype=int)
+    n, r, c = solution // (K*K) + 1, solution // K % K, solution % K
+    board[r, c] = n
 
     return board
 
 if __name__ == '__main__':
-    starting_board = np.loadtxt(sys.argv[1], dtype=np.int)
+    starting_board = np.loadtxt(sys.argv[1], dtype=int)
 
     print('Generating exact cover problem...')
-    mat = exact_cover_problem(starting_board)
-
-    print('Saving to file...')
-    np.savetxt('problem', mat.astype(np.int), fmt='%r')
+    mat = full_exact_cover_problem(starting_board.shape[0], sparse=True)
 
-    print('Solving exact cover problem...')
-    os.spawnl(os.P_WAIT, 'dance', 'dance', 'problem', 'solution')
+    backend = dance_backends.get_backend()
+    print('Solving exact cover problem with the %s backend...' % backend.name)
 
-    solution = load_solution('solution')
+    # The clues are forced rows, and a second solution is all it takes to
+    # know the board is not unique
+    try:
+        solution = backend.solve(mat, limit=2, forced_rows=clue_rows(starting_board))
+    except ValueError:
+        solution = []
     if len(solution) == 0:
         print('No solutions found!')
         sys.exit(1)
@@ -105,8 +160,8 @@ if __name__ == '__main__':
     board = board_for_solution(solution[0], starting_board.shape[0])
 
     print('\nSolved board is:')
-    s = string.join([string.join(row.astype('S'), ' ') for row in board], '\n')
+    s = '\n'.join([' '.join(map(str, row)) for row in board])
     print('%s\n' % s)
 
     if len(sys.argv) > 2:
-        np.savetxt(sys.argv[2], board, fmt='%r')
+        np.savetxt(sys.argv[2], board, fmt='%d')
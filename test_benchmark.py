@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+import unittest
+
+import benchmark
+import dance
+
+class TestBenchmark(unittest.TestCase):
+    def test_n_queens(self):
+        counts = [dance.ArrayDancingLinks(benchmark.n_queens(n)).count_solutions()
+                  for n in range(1, 9)]
+        self.assertEqual(counts, [1, 0, 0, 2, 10, 4, 40, 92])
+
+    def test_langford(self):
+        counts = [dance.ArrayDancingLinks(benchmark.langford(n)).count_solutions()
+                  for n in range(1, 9)]
+        self.assertEqual(counts, [0, 0, 2, 2, 0, 0, 52, 300])
+
+    def test_sudoku(self):
+        self.assertTrue(dance.ArrayDancingLinks(benchmark.hard_sudoku()).is_unique())
+        self.assertEqual(benchmark.random_sudoku(16, 16).shape, (16**3, 4 * 16**2))
+
+    def test_run(self):
+        result = benchmark.run('langford_8', 'python')
+
+        self.assertEqual(result['solutions'], 300)
+        self.assertEqual(result['columns'], 24)
+        self.assertGreater(result['nodes'], 0)
+        self.assertGreater(result['updates'], result['nodes'])
+        self.assertEqual(result['nodes_per_sec'], result['nodes'] / result['solve_time'])
+
+    def test_backend_names(self):
+        names = benchmark.backend_names()
+        self.assertEqual(names[:2], ['python', 'python-array'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
 import numpy as np
+import os
+import shutil
+import sys
+import tempfile
 import unittest
 
 import dance
@@ -185,3 +189,774 @@ class TestDance(unittest.TestCase):
         self.assertEqual(set([frozenset(s) for s in result]),
                          set([frozenset([0,3,4]), frozenset([0,1,6]), frozenset([2,3,7])]))
 
+
+class TestArrayDance(unittest.TestCase):
+    def test_build_data_structure(self):
+        mat = np.array([[0, 0, 1, 1],
+                        [1, 0, 1, 0],
+                        [0, 0, 0, 0],
+                        [0, 1, 0, 0]],
+                       dtype=np.bool)
+
+        dl = dance.ArrayDancingLinks(mat)
+
+        c0, c1, c2, c3 = dl.columns
+        e02, e03, e10, e12, e31 = range(5, 10)
+
+        self.assertEqual(dl.R[dl.head], c0)
+        self.assertEqual(dl.L[dl.head], c3)
+        self.assertEqual([dl.size[c] for c in dl.columns], [1, 1, 2, 1])
+
+        self.assertEqual(dl.D[c2], e02)
+        self.assertEqual(dl.D[e02], e12)
+        self.assertEqual(dl.D[e12], c2)
+        self.assertEqual(dl.U[c2], e12)
+        self.assertEqual(dl.U[e12], e02)
+        self.assertEqual(dl.U[e02], c2)
+
+        self.assertEqual(dl.R[e02], e03)
+        self.assertEqual(dl.L[e02], e03)
+        self.assertEqual(dl.R[e10], e12)
+        self.assertEqual(dl.L[e10], e12)
+        self.assertEqual(dl.R[e31], e31)
+        self.assertEqual(dl.L[e31], e31)
+
+        self.assertEqual([dl.C[e] for e in range(5, 10)], [c2, c3, c0, c2, c1])
+        self.assertEqual([dl.key[e] for e in range(5, 10)], [0, 0, 1, 1, 3])
+
+    def test_matches_node_implementation(self):
+        rng = np.random.RandomState(0)
+        for _ in range(50):
+            mat = rng.rand(10, 6) < 0.3
+
+            node_dl = dance.DancingLinks(mat)
+            array_dl = dance.ArrayDancingLinks(mat)
+
+            expected = [list(s) for s in node_dl.generate_all_solutions()]
+            result = [list(s) for s in array_dl.generate_all_solutions()]
+
+            self.assertEqual(result, expected)
+            self.assertEqual(array_dl.nodes_searched, node_dl.nodes_searched)
+
+class TestIterativeSearch(unittest.TestCase):
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() + 100
+        mat = np.eye(depth, dtype=np.bool)
+
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(mat)
+            result = dl.generate_all_solutions()
+
+            self.assertEqual(len(result), 1)
+            self.assertEqual(list(result[0]), list(range(depth)))
+            self.assertEqual(dl.nodes_searched, depth)
+
+    def test_explore_stack(self):
+        mat = np.array([[1, 0, 1],
+                        [0, 1, 0],
+                        [1, 1, 0],
+                        [0, 0, 1]], dtype=np.bool)
+
+        dl = dance.DancingLinks(mat)
+        stacks = [[dl.row_key(r) for r in stack] for stack in dl.explore()]
+
+        self.assertEqual(stacks, [[0, 1], [2, 3]])
+        self.assertEqual(dl.stack, [])
+
+class TestSolutionLimits(unittest.TestCase):
+    mat = np.array([[0, 0, 1, 0, 1, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 1],
+                    [0, 1, 1, 0, 0, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 0],
+                    [0, 1, 0, 0, 0, 0, 1],
+                    [0, 0, 0, 1, 1, 0, 1],
+                    [0, 1, 0, 0, 0, 0, 0],
+                    [0, 0, 0, 0, 1, 0, 1]], dtype=np.bool)
+
+    def test_solve_limit(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.mat)
+            all_solutions = dl.all_solutions()
+            full_nodes = dl.nodes_searched
+
+            first = dl.solve(limit=1)
+            self.assertEqual(len(first), 1)
+            self.assertEqual(list(first[0]), list(all_solutions[0]))
+            self.assertLess(dl.nodes_searched, full_nodes)
+
+            # Stopping early leaves the structure ready for another search
+            self.assertEqual([list(s) for s in dl.all_solutions()],
+                             [list(s) for s in all_solutions])
+            self.assertEqual(dl.nodes_searched, full_nodes)
+
+    def test_iter_solutions(self):
+        dl = dance.ArrayDancingLinks(self.mat)
+        solutions = dl.iter_solutions()
+
+        self.assertEqual(set(next(solutions)), set([0, 1, 6]))
+        self.assertEqual(dl.nodes_searched, 3)
+        solutions.close()
+        self.assertEqual([dl.size[c] for c in dl.columns],
+                         list(self.mat.sum(axis=0)))
+        self.assertEqual(dl.R[dl.head], dl.columns[0])
+
+    def test_count_solutions(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.mat)
+
+            self.assertEqual(dl.count_solutions(), 3)
+            self.assertEqual(dl.count_solutions(by_depth=True), (3, [0, 0, 0, 3]))
+            self.assertEqual(cls(self.mat[1:6]).count_solutions(), 0)
+
+            mixed = np.array([[1, 1, 0],
+                              [0, 0, 1],
+                              [1, 0, 0],
+                              [0, 1, 0]], dtype=np.bool)
+            self.assertEqual(cls(mixed).count_solutions(by_depth=True),
+                             (2, [0, 0, 1, 1]))
+
+    def test_is_unique(self):
+        self.assertFalse(dance.DancingLinks(self.mat).is_unique())
+        self.assertTrue(dance.DancingLinks(self.mat[:6]).is_unique())
+        self.assertFalse(dance.DancingLinks(self.mat[1:6]).is_unique())
+
+class TestSparseInput(unittest.TestCase):
+    mat = np.array([[0, 0, 1, 0, 1, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 1],
+                    [0, 1, 1, 0, 0, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 0],
+                    [0, 0, 0, 0, 0, 0, 0],
+                    [0, 1, 0, 0, 0, 0, 1],
+                    [0, 0, 0, 1, 1, 0, 1]], dtype=np.bool)
+
+    rows = [[2, 4, 5], [6, 0, 3], [1, 2, 5], [0, 3], [], [1, 6], [3, 4, 6]]
+
+    def test_sparse_matrix(self):
+        from_rows = dance.SparseMatrix.from_rows(self.rows, 7)
+        from_dense = dance.as_sparse(self.mat)
+
+        self.assertEqual(list(from_rows.indptr), list(from_dense.indptr))
+        self.assertEqual(list(from_rows.indices), list(from_dense.indices))
+        self.assertEqual(from_rows.shape, (7, 7))
+        self.assertEqual(from_rows.nnz, 16)
+        self.assertEqual(list(from_rows.row(1)), [0, 3, 6])
+        self.assertTrue(np.array_equal(from_rows.toarray(), self.mat))
+
+    def test_from_rows(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            expected = [list(s) for s in cls(self.mat).all_solutions()]
+            result = [list(s) for s in cls.from_rows(self.rows, 7).all_solutions()]
+
+            self.assertEqual(result, expected)
+            self.assertEqual(sorted(expected[0]), [0, 3, 5])
+
+    def test_scipy_sparse(self):
+        try:
+            import scipy.sparse
+        except ImportError:
+            self.skipTest('scipy is not installed')
+
+        for convert in [scipy.sparse.csr_matrix, scipy.sparse.coo_matrix]:
+            for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+                result = cls(convert(self.mat)).all_solutions()
+                self.assertEqual([sorted(s) for s in result], [[0, 3, 5]])
+
+class TestFileFormats(unittest.TestCase):
+    mat = np.array([[0, 0, 1, 0, 1, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 1],
+                    [0, 0, 0, 0, 0, 0, 0],
+                    [0, 1, 1, 0, 0, 1, 0]], dtype=np.bool)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'file')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_binary_problem(self):
+        dance.save_problem(self.filename, self.mat)
+        loaded = dance.load_problem(self.filename)
+
+        self.assertIsInstance(loaded, dance.SparseMatrix)
+        self.assertFalse(loaded.indices.flags.writeable)
+        self.assertEqual(loaded.shape, self.mat.shape)
+        self.assertTrue(np.array_equal(loaded.toarray(), self.mat))
+
+    def test_text_problem(self):
+        dance.save_problem(self.filename, self.mat, text=True)
+        loaded = dance.load_problem(self.filename)
+
+        self.assertTrue(np.array_equal(loaded, self.mat))
+
+    def test_solutions(self):
+        solutions = [np.array([0, 3, 5]), np.array([2]), np.array([], dtype=int)]
+
+        for text in [False, True]:
+            dance.save_solutions(self.filename, solutions, text=text)
+            loaded = dance.load_solutions(self.filename)
+
+            data = dance.read_input(self.filename)
+            self.assertEqual(dance.is_binary(data, dance.SOLUTION_MAGIC),
+                             not text)
+            self.assertEqual([list(s) for s in loaded], [[0, 3, 5], [2], []])
+
+    def test_pack_problem(self):
+        data = dance.pack_problem(self.mat)
+        self.assertTrue(np.array_equal(dance.unpack_problem(data).toarray(),
+                                       self.mat))
+
+    def test_secondary_columns(self):
+        colored = TestSecondaryColumns.colored
+        data = dance.pack_problem(colored, n_secondary=2)
+        loaded = dance.unpack_problem(data)
+
+        self.assertEqual(loaded.n_secondary, 2)
+        self.assertTrue(np.array_equal(loaded.toarray(), colored))
+        self.assertEqual([list(s) for s in dance.DancingLinks(loaded).solve()], [[3, 1]])
+
+        # Without colors only the number of secondary columns is stored
+        dance.save_problem(self.filename, self.mat, n_secondary=2)
+        loaded = dance.load_problem(self.filename)
+        self.assertEqual(loaded.n_secondary, 2)
+        self.assertIsNone(loaded.data)
+
+        self.assertRaises(ValueError, dance.save_problem, self.filename, colored,
+                          text=True, n_secondary=2)
+        self.assertRaises(ValueError, dance.pack_problem, colored)
+
+    def test_wrong_file_type(self):
+        dance.save_solutions(self.filename, [[1, 2]])
+        data = dance.read_input(self.filename)
+        self.assertRaises(ValueError, dance.unpack, data, dance.PROBLEM_MAGIC)
+
+class TestForcedRows(unittest.TestCase):
+    mat = np.array([[0, 0, 1, 0, 1, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 1],
+                    [0, 1, 1, 0, 0, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 0],
+                    [0, 1, 0, 0, 0, 0, 1],
+                    [0, 0, 0, 1, 1, 0, 1],
+                    [0, 1, 0, 0, 0, 0, 0],
+                    [0, 0, 0, 0, 1, 0, 1]], dtype=np.bool)
+
+    def test_forced_rows(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.mat, forced_rows=[3])
+            result = dl.all_solutions()
+
+            self.assertEqual(set(frozenset(s) for s in result),
+                             set([frozenset([0, 3, 4]), frozenset([2, 3, 7])]))
+            self.assertTrue(all(s[0] == 3 for s in result))
+            self.assertEqual(dl.forced_keys(), [3])
+
+    def test_force_and_release(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.mat)
+            dl.all_solutions()
+            full_nodes = dl.nodes_searched
+
+            dl.force_rows([2, 3])
+            self.assertEqual([sorted(s) for s in dl.all_solutions()], [[2, 3, 7]])
+            self.assertLess(dl.nodes_searched, full_nodes)
+
+            dl.release_rows()
+            self.assertEqual(len(dl.all_solutions()), 3)
+            self.assertEqual(dl.nodes_searched, full_nodes)
+
+    def test_invalid_forced_rows(self):
+        dl = dance.ArrayDancingLinks(self.mat, forced_rows=[0])
+
+        self.assertRaises(ValueError, dl.force_rows, [2])
+        self.assertRaises(ValueError, dl.force_rows, [100])
+        self.assertEqual(dl.forced_keys(), [0])
+
+    def test_forced_problem(self):
+        mat = dance.forced_problem(self.mat, [3])
+        result = dance.DancingLinks(mat).all_solutions()
+
+        self.assertEqual(set(frozenset(s) for s in result),
+                         set([frozenset([0, 3, 4]), frozenset([2, 3, 7])]))
+        self.assertEqual(list(np.nonzero(mat.toarray().any(axis=1))[0]),
+                         [0, 2, 3, 4, 6, 7])
+        self.assertRaises(ValueError, dance.forced_problem, self.mat, [1, 3])
+
+class TestSecondaryColumns(unittest.TestCase):
+    # Knuth's example: primary columns p, q, r and secondary columns x, y,
+    # values of 2 and 3 are the colors A and B
+    colored = np.array([[1, 1, 0, 1, 2],
+                        [1, 0, 1, 2, 1],
+                        [1, 0, 0, 3, 0],
+                        [0, 1, 0, 2, 0],
+                        [0, 0, 1, 0, 3]])
+
+    def queens(self, n):
+        """n queens with the diagonals as secondary columns"""
+        rows = [[r, n + c, 2*n + r + c, 4*n - 1 + r - c + n - 1]
+                for r in range(n) for c in range(n)]
+        return dance.SparseMatrix.from_rows(rows, 2*n + 2*(2*n - 1))
+
+    def test_queens(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            counts = [cls(self.queens(n), n_secondary=2*(2*n - 1)).count_solutions()
+                      for n in range(1, 9)]
+            self.assertEqual(counts, [1, 0, 0, 2, 10, 4, 40, 92])
+
+    def test_secondary_only_rows(self):
+        mat = np.array([[1, 0, 1],
+                        [0, 1, 1],
+                        [1, 1, 0],
+                        [0, 0, 1]])
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            result = cls(mat, n_secondary=1).all_solutions()
+            self.assertEqual([sorted(s) for s in result], [[2]])
+
+    def test_colors(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.colored, n_secondary=2)
+            self.assertTrue(dl.colored)
+            self.assertEqual([sorted(s) for s in dl.all_solutions()], [[1, 3]])
+
+            # Without colors every row excludes the others in x and y
+            plain = cls(self.colored > 0, n_secondary=2)
+            self.assertFalse(plain.colored)
+            self.assertEqual(plain.all_solutions(), [])
+
+    def test_colors_restored(self):
+        dl = dance.ArrayDancingLinks(self.colored, n_secondary=2)
+        links = [list(l) for l in [dl.L, dl.R, dl.U, dl.D, dl.size, dl.color]]
+
+        dl.all_solutions()
+        dl.force_rows([3])
+        dl.all_solutions()
+        dl.release_rows()
+        self.assertEqual([dl.L, dl.R, dl.U, dl.D, dl.size, dl.color], links)
+
+    def test_forced_colors(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.colored, n_secondary=2, forced_rows=[3, 1])
+            self.assertEqual([s.tolist() for s in dl.all_solutions()], [[3, 1]])
+
+            self.assertRaises(ValueError, cls, self.colored, n_secondary=2,
+                              forced_rows=[3, 2])
+
+    def test_primary_colors(self):
+        self.assertRaises(ValueError, dance.DancingLinks, self.colored, n_secondary=1)
+
+    def test_sparse_colors(self):
+        mat = dance.as_sparse(self.colored)
+        self.assertEqual(mat.data.tolist(), self.colored[self.colored > 0].tolist())
+        self.assertTrue(np.array_equal(mat.toarray(), self.colored))
+
+class TestColumnSelection(unittest.TestCase):
+    def problems(self):
+        sec = TestSecondaryColumns()
+        return [(TestForcedRows.mat, {}),
+                (sec.queens(6), {'n_secondary': 22}),
+                (sec.colored, {'n_secondary': 2})]
+
+    def bucket_sets(self, dl):
+        """Column indices in each bucket, checking none is bigger than its
+        column"""
+        if isinstance(dl, dance.ArrayDancingLinks):
+            following, index = (lambda c: dl.SR[c]), (lambda c: c - 1)
+        else:
+            following, index = (lambda c: c.SR), (lambda c: c.key)
+
+        buckets = []
+        for s, h in enumerate(dl.buckets):
+            bucket = set()
+            c = following(h)
+            while c != h:
+                self.assertLessEqual(s, dl.column_size(c))
+                bucket.add(index(c))
+                c = following(c)
+            buckets.append(bucket)
+        if any(buckets):
+            self.assertLessEqual(dl.low, min(s for s, bucket in enumerate(buckets) if bucket))
+        return buckets
+
+    def remaining_columns(self, dl):
+        """Sizes of the primary columns left, by column index"""
+        columns = {}
+        c = dl.right(dl.head)
+        while c != dl.head:
+            columns[dl.column_index(c)] = dl.column_size(c)
+            c = dl.right(c)
+        return columns
+
+    def test_same_solutions(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            for mat, options in self.problems():
+                scan = cls(mat, column_selection='scan', **options)
+                bucket = cls(mat, column_selection='bucket', **options)
+
+                solutions = sorted(sorted(s.tolist()) for s in scan.all_solutions())
+                self.assertEqual(sorted(sorted(s.tolist()) for s in bucket.all_solutions()),
+                                 solutions)
+
+                first = cls(mat, column_selection='first', **options)
+                self.assertEqual(sorted(sorted(s.tolist()) for s in first.all_solutions()),
+                                 solutions)
+
+    def test_smallest_column(self):
+        queens = TestSecondaryColumns().queens(6)
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(queens, n_secondary=22, column_selection='bucket')
+            for stack in dl.explore(max_depth=3):
+                if dl.is_solved():
+                    continue
+                buckets = self.bucket_sets(dl)
+                columns = self.remaining_columns(dl)
+                self.assertEqual(set().union(*buckets), set(columns))
+
+                c = dl.select_bucketed()
+                self.assertEqual(dl.column_size(c), min(columns.values()))
+                self.bucket_sets(dl)
+
+    def test_buckets_restored(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(TestForcedRows.mat, column_selection='bucket')
+            columns = self.remaining_columns(dl)
+
+            dl.force_rows([3])
+            self.assertNotEqual(set().union(*self.bucket_sets(dl)), set(columns))
+            dl.all_solutions()
+            dl.release_rows()
+            self.assertEqual(set().union(*self.bucket_sets(dl)), set(columns))
+            self.assertEqual(self.remaining_columns(dl), columns)
+
+    def test_options(self):
+        dl = dance.ArrayDancingLinks(TestForcedRows.mat, use_greedy_column_selection=False)
+        self.assertEqual(dl.column_selection, 'first')
+        self.assertEqual(dl.select_column(), 1)
+
+        self.assertRaises(ValueError, dance.DancingLinks, TestForcedRows.mat,
+                          column_selection='random')
+
+class TestSearchStats(unittest.TestCase):
+    def test_stats(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(TestSecondaryColumns().queens(6), n_secondary=22)
+            expected = dl.all_solutions()
+            nodes = dl.nodes_searched
+
+            calls = []
+            solutions, stats = dl.solve_with_stats(progress=lambda s: calls.append(s.nodes),
+                                                   interval=10)
+
+            self.assertEqual([s.tolist() for s in solutions], [s.tolist() for s in expected])
+            self.assertEqual(stats.nodes, nodes)
+            self.assertEqual(stats.solutions, 4)
+            self.assertEqual(sum(stats.nodes_by_depth), nodes)
+            self.assertEqual(sum(stats.branching), nodes)
+            self.assertEqual(calls, list(range(10, nodes + 1, 10)))
+
+            self.assertEqual(len(stats.column_covers), 34)
+            self.assertGreaterEqual(sum(stats.column_covers), nodes)
+            self.assertGreater(stats.updates, sum(stats.column_covers))
+            self.assertGreaterEqual(stats.wall_time, 0)
+            self.assertEqual(sorted(stats.as_dict()),
+                             ['branching', 'column_covers', 'cpu_time', 'nodes',
+                              'nodes_by_depth', 'solutions', 'updates', 'wall_time'])
+
+            # Searching without stats no longer counts
+            self.assertIsNone(dl.stats)
+            dl.all_solutions()
+            self.assertEqual(stats.nodes, nodes)
+
+            # Stats cannot be started twice, which would leave cover wrapped
+            cover = dl.cover
+            dl.start_stats()
+            self.assertRaises(ValueError, dl.start_stats)
+            dl.stop_stats()
+            self.assertEqual(dl.cover, cover)
+
+    def test_generate_all_solutions(self):
+        dl = dance.ArrayDancingLinks(TestForcedRows.mat)
+        solutions = dl.generate_all_solutions(limit=1)
+
+        self.assertEqual(len(solutions), 1)
+        self.assertEqual(dl.last_stats.solutions, 1)
+        self.assertEqual(dl.last_stats.nodes, dl.nodes_searched)
+
+class TestTreeEstimate(unittest.TestCase):
+    def test_estimate(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(TestSecondaryColumns().queens(6), n_secondary=22)
+            count = dl.count_solutions()
+            nodes = dl.nodes_searched
+
+            estimate = dl.estimate_tree_size(samples=2000, seed=0)
+            self.assertEqual(estimate.samples, 2000)
+            self.assertLess(estimate.nodes_low, nodes)
+            self.assertGreater(estimate.nodes_high, nodes)
+            self.assertLess(estimate.solutions_low, count)
+            self.assertGreater(estimate.solutions_high, count)
+
+            # The search is unchanged afterwards
+            self.assertEqual(dl.count_solutions(), count)
+            self.assertEqual(dl.nodes_searched, nodes)
+
+    def test_exact_without_choices(self):
+        # Every column has one row at each node, so every path is the tree
+        mat = np.eye(5, dtype=bool)
+        estimate = dance.ArrayDancingLinks(mat).estimate_tree_size(samples=3)
+
+        self.assertEqual((estimate.nodes, estimate.nodes_low, estimate.nodes_high), (5, 5, 5))
+        self.assertEqual(estimate.solutions, 1)
+
+    def test_no_samples(self):
+        dl = dance.ArrayDancingLinks(TestForcedRows.mat)
+        self.assertRaises(ValueError, dl.estimate_tree_size, samples=0)
+
+    def test_restores_structure(self):
+        dl = dance.ArrayDancingLinks(TestForcedRows.mat, forced_rows=[3])
+        links = [list(l) for l in [dl.L, dl.R, dl.U, dl.D, dl.size]]
+
+        dl.estimate_tree_size(samples=10, prefix=[4], seed=1)
+        self.assertEqual([dl.L, dl.R, dl.U, dl.D, dl.size], links)
+
+    def test_prefix(self):
+        dl = dance.ArrayDancingLinks(TestForcedRows.mat)
+        total = 0
+        for prefix in dl.split(1):
+            estimate = dl.estimate_tree_size(samples=5, prefix=prefix)
+            total += estimate.nodes
+
+        # Each branch here has no further choices, so the estimates are
+        # exact and add up to the tree below the root
+        dl.count_solutions()
+        self.assertEqual(total + 1, dl.nodes_searched)
+
+class TestCheckpoints(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'checkpoint')
+        self.mat = TestSecondaryColumns().queens(6)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def solutions(self, result):
+        return [s.tolist() for s in result]
+
+    def test_interrupted(self):
+        for cls in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = cls(self.mat, n_secondary=22)
+            expected = self.solutions(dl.all_solutions())
+            nodes = dl.nodes_searched
+
+            # Stop without a final save, as if the process was killed
+            checkpoint = dance.Checkpoint(self.filename, interval=50)
+            for stack in dl.explore(checkpoint=checkpoint):
+                checkpoint.add(dl.solution_keys(stack))
+                if checkpoint.n_solutions == 3:
+                    break
+            checkpoint.close()
+
+            resumed = cls(self.mat, n_secondary=22)
+            self.assertEqual(self.solutions(resumed.resume(self.filename)), expected)
+            self.assertEqual(resumed.nodes_searched, nodes)
+
+    def test_limit(self):
+        dl = dance.ArrayDancingLinks(self.mat, n_secondary=22, forced_rows=[1])
+        expected = self.solutions(dl.all_solutions())
+
+        first = dl.solve_with_checkpoints(self.filename, limit=1, interval=5)
+        self.assertEqual(self.solutions(first), expected[:1])
+
+        resumed = dance.ArrayDancingLinks(self.mat, n_secondary=22)
+        self.assertEqual(self.solutions(resumed.resume(self.filename)), expected)
+        self.assertEqual(resumed.forced_keys(), [1])
+
+        # A finished search is not searched again, and its solutions are
+        # kept apart from the position
+        checkpoint = dance.Checkpoint.load(self.filename)
+        self.assertTrue(checkpoint.done)
+        self.assertEqual(checkpoint.n_solutions, len(expected))
+        self.assertEqual(self.solutions(checkpoint.solutions()), expected)
+        self.assertEqual(self.solutions(resumed.resume(self.filename)), expected)
+
+    def test_sink(self):
+        dl = dance.DancingLinks(self.mat, n_secondary=22)
+        expected = self.solutions(dl.all_solutions())
+
+        sink = dl.solve_with_checkpoints(self.filename, limit=2, interval=5,
+                                         sink=dance.PackedSolutions())
+        self.assertEqual(self.solutions(sink), expected[:2])
+
+        resumed = dance.DancingLinks(self.mat, n_secondary=22)
+        sink = resumed.resume(self.filename, sink=dance.PackedSolutions())
+        self.assertEqual(self.solutions(sink), expected)
+
+        sink = resumed.resume(self.filename, limit=1, sink=dance.PackedSolutions())
+        self.assertEqual(self.solutions(sink), expected[:1])
+
+    def test_prefix(self):
+        dl = dance.ArrayDancingLinks(self.mat, n_secondary=22)
+        prefix = dl.split(1)[1]
+        expected = self.solutions(dl.solution_keys(s) for s in dl.explore(prefix))
+
+        dl.solve_with_checkpoints(self.filename, limit=1, interval=1, prefix=prefix)
+        self.assertEqual(self.solutions(dl.resume(self.filename)), expected)
+
+    def test_wrong_forced_rows(self):
+        dl = dance.ArrayDancingLinks(self.mat, n_secondary=22, forced_rows=[1])
+        dl.solve_with_checkpoints(self.filename, limit=1)
+
+        other = dance.ArrayDancingLinks(self.mat, n_secondary=22, forced_rows=[2])
+        self.assertRaises(ValueError, other.resume, self.filename)
+
+class TestSolutionSinks(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dl = dance.ArrayDancingLinks(TestSecondaryColumns().queens(6), n_secondary=22,
+                                          forced_rows=[1])
+        self.expected = [s.tolist() for s in self.dl.all_solutions()]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_packed_solutions(self):
+        sink = self.dl.solve(sink=dance.PackedSolutions(capacity=1))
+
+        self.assertEqual(len(sink), 1)
+        self.assertEqual([s.tolist() for s in sink], self.expected)
+        self.assertEqual(sink[-1].tolist(), self.expected[-1])
+        self.assertRaises(IndexError, sink.__getitem__, 1)
+
+        queens = dance.ArrayDancingLinks(TestSecondaryColumns().queens(6), n_secondary=22)
+        expected = [s.tolist() for s in queens.all_solutions()]
+        sink = queens.solve(limit=3, sink=dance.PackedSolutions(capacity=1))
+        self.assertEqual([s.tolist() for s in sink], expected[:3])
+
+        indptr, keys = sink.arrays()
+        self.assertEqual(indptr.tolist(), [0, 6, 12, 18])
+        self.assertEqual([s.tolist() for s in dance.unpack_solutions(dance.pack_solutions(sink))],
+                         expected[:3])
+
+    def test_solution_writer(self):
+        queens = dance.ArrayDancingLinks(TestSecondaryColumns().queens(6), n_secondary=22)
+        expected = [s.tolist() for s in queens.all_solutions()]
+
+        for text in [False, True]:
+            filename = os.path.join(self.directory, 'solutions')
+            sink = dance.SolutionWriter(filename, text=text, buffer_size=5)
+            queens.solve(sink=sink)
+            sink.close()
+
+            self.assertEqual(len(sink), len(expected))
+            self.assertEqual([s.tolist() for s in dance.load_solutions(filename)], expected)
+
+    def test_empty_writer(self):
+        filename = os.path.join(self.directory, 'solutions')
+        sink = dance.SolutionWriter(filename)
+        sink.close()
+        self.assertEqual(dance.load_solutions(filename), [])
+
+    def test_callback(self):
+        found = []
+        sink = self.dl.solve(sink=dance.SolutionCallback(found.append))
+
+        self.assertEqual(len(sink), len(self.expected))
+        self.assertEqual(found, self.expected)
+
+class TestComponents(unittest.TestCase):
+    def setUp(self):
+        # Two copies of a problem with disjoint columns
+        rng = np.random.RandomState(4)
+        block = rng.rand(20, 8) < 0.25
+        empty = np.zeros_like(block)
+        self.mat = np.block([[block, empty], [empty, block]])
+
+    def solution_set(self, solutions):
+        return sorted(tuple(sorted(s)) for s in solutions)
+
+    def test_components(self):
+        for engine in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = engine(self.mat)
+            components = [[dl.column_index(c) for c in columns]
+                          for columns in dl.components()]
+            self.assertEqual(len(components), 2)
+            self.assertEqual(components, [list(range(8)), list(range(8, 16))])
+
+    def test_count(self):
+        for engine in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = engine(self.mat)
+            count = dl.count_solutions()
+            for levels in [0, 1, 3]:
+                self.assertEqual(dl.count_by_components(levels), count)
+
+    def test_solutions(self):
+        rng = np.random.RandomState(6)
+        for _ in range(10):
+            mat = rng.rand(25, 12) < 0.15
+            for n_secondary in [0, 3]:
+                dl = dance.ArrayDancingLinks(mat, n_secondary=n_secondary)
+                expected = self.solution_set(dl.solve())
+                for levels in [0, 2]:
+                    solutions = dl.solve_by_components(levels)
+                    self.assertEqual(len(solutions), len(expected))
+                    self.assertEqual(self.solution_set(solutions), expected)
+
+    def test_forced_rows(self):
+        dl = dance.DancingLinks(self.mat)
+        key = dl.solve(1)[0][0]
+        expected = self.solution_set(dance.DancingLinks(self.mat, forced_rows=[key]).solve())
+
+        dl.force_rows([key])
+        self.assertEqual(self.solution_set(dl.solve_by_components()), expected)
+
+class TestMemoizedCounting(unittest.TestCase):
+    def dominoes(self, height, width):
+        rows = []
+        for r in range(height):
+            for c in range(width):
+                if c + 1 < width:
+                    rows.append([r * width + c, r * width + c + 1])
+                if r + 1 < height:
+                    rows.append([r * width + c, (r + 1) * width + c])
+        return dance.SparseMatrix.from_rows(rows, height * width)
+
+    def test_dominoes(self):
+        for engine in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            dl = engine(self.dominoes(6, 6))
+            count, cache = dl.count_memoized()
+            self.assertEqual(count, 6728)
+            self.assertGreater(cache.hits, 0)
+            self.assertEqual(cache.misses, dl.nodes_searched)
+
+            # The structure is left as built
+            self.assertEqual(dl.count_solutions(), 6728)
+            self.assertLess(cache.misses, dl.nodes_searched)
+
+    def test_random_problems(self):
+        rng = np.random.RandomState(8)
+        for _ in range(20):
+            mat = rng.rand(25, 12) < 0.2
+            for n_secondary in [0, 3]:
+                dl = dance.ArrayDancingLinks(mat, n_secondary=n_secondary)
+                count, _ = dl.count_memoized()
+                self.assertEqual(count, dl.count_solutions())
+
+    def test_eviction(self):
+        dl = dance.ArrayDancingLinks(self.dominoes(4, 5))
+        count, cache = dl.count_memoized(max_entries=10)
+        self.assertEqual(count, dl.count_solutions())
+        self.assertEqual(len(cache), 10)
+        self.assertGreater(cache.evictions, 0)
+
+    def test_reused_cache(self):
+        dl = dance.DancingLinks(self.dominoes(4, 4))
+        count, cache = dl.count_memoized()
+        expected = dance.DancingLinks(self.dominoes(4, 4), forced_rows=[0]).count_solutions()
+
+        dl.force_rows([0])
+        self.assertEqual(dl.count_memoized(cache)[0], expected)
+        self.assertEqual(dl.nodes_searched, 0)
+
+    def test_colors(self):
+        mat = np.array([[1, 2], [1, 3]])
+        dl = dance.DancingLinks(mat, n_secondary=1)
+        self.assertRaises(ValueError, dl.count_memoized)
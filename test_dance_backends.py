@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import dance
+import dance_backends
+
+class TestDanceBackends(unittest.TestCase):
+    mat = np.array([[0, 0, 1, 0, 1, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 1],
+                    [0, 1, 1, 0, 0, 1, 0],
+                    [1, 0, 0, 1, 0, 0, 0],
+                    [0, 1, 0, 0, 0, 0, 1],
+                    [0, 0, 0, 1, 1, 0, 1],
+                    [0, 1, 0, 0, 0, 0, 0],
+                    [0, 0, 0, 0, 1, 0, 1]], dtype=np.bool)
+
+    def setUp(self):
+        self.expected = [list(s) for s in dance.DancingLinks(self.mat).all_solutions()]
+
+    def test_python_backend(self):
+        backend = dance_backends.PythonBackend()
+
+        self.assertEqual([list(s) for s in backend.solve(self.mat)], self.expected)
+        self.assertEqual(len(backend.solve(self.mat, limit=2)), 2)
+
+    def test_subprocess_backend(self):
+        script = os.path.join(dance_backends.here, 'dance.py')
+        backend = dance_backends.SubprocessBackend([sys.executable, script])
+
+        self.assertTrue(backend.available())
+        self.assertEqual([list(s) for s in backend.solve(self.mat)], self.expected)
+        self.assertEqual([list(s) for s in backend.solve(self.mat, limit=1)],
+                         self.expected[:1])
+
+    def test_subprocess_failure(self):
+        backend = dance_backends.SubprocessBackend([sys.executable, '-c',
+                                                    'import sys; sys.exit(3)'])
+        self.assertRaises(RuntimeError, backend.solve, self.mat)
+
+    def test_solve(self):
+        result = dance_backends.solve(self.mat, backend='python')
+        self.assertEqual([list(s) for s in result], self.expected)
+
+        self.assertEqual(dance_backends.get_backend().name,
+                         dance_backends.available_backends()[0].name)
+        self.assertRaises(ValueError, dance_backends.get_backend, 'missing')
+
+    def test_pypy_script(self):
+        # The script only needs numpy for text problems
+        backend = dance_backends.PypyBackend(sys.executable)
+        self.assertEqual([list(s) for s in backend.solve(self.mat)], self.expected)
+
+    def test_pypy_version(self):
+        self.assertTrue(dance_backends.PypyBackend(sys.executable).available())
+        self.assertFalse(dance_backends.PypyBackend('missing-pypy').available())
+
+        # An interpreter that reports Python 2
+        directory = tempfile.mkdtemp()
+        try:
+            pypy = os.path.join(directory, 'pypy')
+            with open(pypy, 'w') as f:
+                f.write('#!/bin/sh\nexit 1\n')
+            os.chmod(pypy, 0o755)
+            self.assertFalse(dance_backends.PypyBackend(pypy).available())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_zero_limit(self):
+        script = os.path.join(dance_backends.here, 'dance.py')
+        backends = [dance_backends.PythonBackend(),
+                    dance_backends.SubprocessBackend([sys.executable, script]),
+                    dance_backends.PypyBackend(sys.executable)]
+        backends += [b for b in dance_backends.available_backends() if b.name == 'go']
+
+        for backend in backends:
+            self.assertEqual(len(backend.solve(self.mat, limit=0)), 0)
+            self.assertEqual(len(backend.solve(self.mat, limit=1)), 1)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+import dance
+import dance_parallel
+
+class TestDanceParallel(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.mat = rng.rand(60, 12) < 0.2
+
+    def test_parallel_solutions(self):
+        dl = dance.DancingLinks(self.mat)
+        expected = [list(s) for s in dl.all_solutions()]
+
+        for levels in [0, 1, 2, 5]:
+            result = dance_parallel.parallel_solutions(self.mat, levels, 2)
+            self.assertEqual([list(s) for s in result], expected)
+
+    def test_balanced_branches(self):
+        dl = dance.DancingLinks(self.mat)
+        expected = [list(s) for s in dl.all_solutions()]
+
+        result = dance_parallel.parallel_solutions(self.mat, 2, 2, samples=20)
+        self.assertEqual([list(s) for s in result], expected)
+
+        branches = dl.split(2)
+        order = dance_parallel.order_branches(dl, branches, 20)
+        self.assertEqual(sorted(order), list(range(len(branches))))
+
+    def test_parallel_count(self):
+        dl = dance.ArrayDancingLinks(self.mat)
+        expected = dl.count_solutions()
+
+        self.assertEqual(dance_parallel.parallel_count(self.mat, 3, 2), expected)
+        self.assertEqual(dance_parallel.parallel_count(self.mat, 2, 2,
+                                                       engine=dance.DancingLinks),
+                         expected)
+
+    def test_nodes_searched(self):
+        dl = dance.ArrayDancingLinks(self.mat)
+        dl.count_solutions()
+
+        _, nodes = dance_parallel.map_branches(
+            dance_parallel.count_branch, self.mat, 2, 2,
+            dance.ArrayDancingLinks, {})
+        self.assertEqual(nodes, dl.nodes_searched)
+
+class TestWorkUnits(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(4)
+        self.mat = rng.rand(50, 10) < 0.25
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_units(self, levels, count_only=False, **options):
+        units = dance_parallel.export_work_units(self.mat, levels, self.directory,
+                                                 **options)
+        problem = os.path.join(self.directory, 'problem')
+
+        results = []
+        for unit in units:
+            result = unit.replace('unit', 'result')
+            dance_parallel.run_work_unit(problem, unit, result, count_only)
+            results.append(result)
+
+        return dance_parallel.merge_results(results)
+
+    def test_work_units(self):
+        dl = dance.ArrayDancingLinks(self.mat)
+        expected = [list(s) for s in dl.all_solutions()]
+
+        full_nodes = dl.nodes_searched
+
+        for levels in [0, 2]:
+            count, nodes, solutions = self.run_units(levels)
+            dl.split(levels)
+
+            self.assertEqual(count, len(expected))
+            self.assertEqual(nodes + dl.nodes_searched, full_nodes)
+            self.assertEqual([list(s) for s in solutions], expected)
+
+    def test_work_units_count_only(self):
+        dl = dance.ArrayDancingLinks(self.mat)
+
+        count, nodes, solutions = self.run_units(3, count_only=True)
+
+        self.assertEqual(count, dl.count_solutions())
+        self.assertEqual(solutions, [])
+
+    def test_work_units_forced_rows(self):
+        key = dance.ArrayDancingLinks(self.mat).solve(1)[0][-1]
+        dl = dance.ArrayDancingLinks(self.mat, forced_rows=[key])
+        expected = [list(s) for s in dl.all_solutions()]
+
+        # The units are run with the default options
+        count, nodes, solutions = self.run_units(2, forced_rows=[key])
+
+        self.assertEqual(count, len(expected))
+        self.assertEqual([list(s) for s in solutions], expected)
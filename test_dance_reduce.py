@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import numpy as np
+import unittest
+
+import dance
+import dance_reduce
+import sudoko
+
+def solution_set(solutions):
+    return sorted(tuple(sorted(s)) for s in solutions)
+
+class TestReduceProblem(unittest.TestCase):
+    def assertSameSolutions(self, matrix, n_secondary=0):
+        expected = dance.DancingLinks(matrix, n_secondary=n_secondary).solve()
+        reduction = dance_reduce.reduce_problem(matrix, n_secondary)
+        dl = dance.ArrayDancingLinks(reduction.matrix, n_secondary=reduction.n_secondary)
+        reduced = dl.solve()
+
+        self.assertEqual(solution_set(reduction.expand_solutions(reduced)),
+                         solution_set(expected))
+        self.assertEqual(reduction.count(reduced), len(expected))
+        return reduction
+
+    def test_random_problems(self):
+        rng = np.random.RandomState(5)
+        for _ in range(20):
+            self.assertSameSolutions(rng.rand(30, 10) < 0.25)
+            self.assertSameSolutions(rng.rand(30, 10) < 0.25, n_secondary=3)
+
+    def test_duplicate_rows(self):
+        mat = np.array([[1, 1, 0],
+                        [0, 0, 1],
+                        [1, 1, 0],
+                        [0, 0, 1]], dtype=bool)
+        reduction = self.assertSameSolutions(mat)
+        self.assertEqual(sorted(reduction.forced), [[0, 2], [1, 3]])
+
+    def test_clashing_rows(self):
+        # Row 2 clashes with both rows of column 0
+        mat = np.array([[1, 1, 0, 0],
+                        [1, 0, 1, 0],
+                        [0, 1, 1, 1],
+                        [0, 1, 0, 1],
+                        [0, 0, 1, 1]], dtype=bool)
+        reduction = self.assertSameSolutions(mat)
+        self.assertNotIn([2], reduction.row_keys)
+
+    def test_merged_columns(self):
+        mat = np.array([[1, 1, 0, 0],
+                        [1, 1, 0, 0],
+                        [0, 0, 1, 1],
+                        [0, 0, 1, 1],
+                        [1, 1, 1, 1]], dtype=bool)
+        reduction = self.assertSameSolutions(mat)
+        self.assertEqual(reduction.matrix.shape[1], 2)
+        self.assertEqual(reduction.columns, [[0, 1], [2, 3]])
+
+    def test_infeasible(self):
+        mat = np.array([[1, 1, 0],
+                        [0, 1, 0]], dtype=bool)
+        reduction = self.assertSameSolutions(mat)
+        self.assertTrue(reduction.infeasible)
+        self.assertEqual(dance_reduce.solve(mat), [])
+
+    def test_sudoku(self):
+        board = np.array([[0, 0, 3, 4],
+                          [3, 4, 0, 0],
+                          [0, 0, 4, 3],
+                          [4, 3, 0, 0]])
+        problem = sudoko.exact_cover_problem(board, sparse=True)
+        reduction = self.assertSameSolutions(problem)
+        self.assertLess(reduction.matrix.shape[0], problem.shape[0])
+
+        solutions = dance_reduce.solve(problem)
+        expected = dance.ArrayDancingLinks(problem).solve()
+        self.assertEqual(solution_set(solutions), solution_set(expected))
+
+    def test_colors(self):
+        mat = np.array([[1, 2],
+                        [1, 2]])
+        self.assertRaises(ValueError, dance_reduce.reduce_problem, mat, 1)
+
+if __name__ == '__main__':
+    unittest.main()
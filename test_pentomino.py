@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import numpy as np
+import unittest
+
+import dance
+import pentomino
+
+def is_valid_location(board, mask, location):
+    """Whether mask fits on the board at location, checked window by
+    window"""
+    i, j = location
+    di, dj = mask.shape
+
+    subboard = board[i:i+di, j:j+dj]
+    return subboard.shape == mask.shape and np.array_equal(mask, mask & subboard)
+
+def row_columns(piece_index, mask, location, column_map):
+    """Columns of a placement, square by square"""
+    i, j = location
+
+    columns = [piece_index]
+    for r, mr in enumerate(mask):
+        for c, v in enumerate(mr):
+            if v:
+                columns.append(column_map[i+r, j+c])
+
+    return columns
+
+class TestPentomino(unittest.TestCase):
+    def test_unique_rotations(self):
+        counts = [len(p.unique_rotations()) for p in pentomino.pieces]
+        self.assertEqual(counts, [8, 1, 8, 4, 4, 4, 4, 4, 8, 8, 8, 2])
+
+        # Cached, not recomputed
+        piece = pentomino.pieces[0]
+        self.assertIs(piece.unique_rotations(), piece.unique_rotations())
+
+    def test_valid_locations(self):
+        board = pentomino.boards['hollow_chess_board']
+        for piece in pentomino.pieces:
+            for mask in piece.unique_rotations():
+                expected = [(i, j) for i in range(board.shape[0]) for j in range(board.shape[1])
+                            if is_valid_location(board, mask, (i, j))]
+                self.assertEqual(pentomino.valid_locations(board, mask), expected)
+
+        self.assertEqual(pentomino.valid_locations(np.ones((3, 3), dtype=bool),
+                                                   pentomino.pieces[-1].mask), [])
+
+    def test_placements(self):
+        board = pentomino.boards['hollow_chess_board']
+        mat, labels = pentomino.placements(board)
+        column_map = np.cumsum(board).reshape(board.shape) + len(pentomino.pieces) - 1
+
+        self.assertEqual(mat.shape, (len(labels), 72))
+        for key in [0, 100, 777, len(labels) - 1]:
+            _, piece_index, mask_index, location = labels[key]
+            mask = pentomino.pieces[piece_index].unique_rotations()[mask_index]
+            self.assertEqual(mat.row(key).tolist(),
+                             row_columns(piece_index, mask, location, column_map))
+
+    def test_solve(self):
+        board = pentomino.boards['hollow_chess_board']
+        _, labels = pentomino.placements(board)
+
+        problem, forced = pentomino.simplified_chess_board_problems()[0]
+        solution = dance.ArrayDancingLinks(problem, forced_rows=forced).solve(1)[0]
+
+        covered = np.zeros(board.shape, dtype=int)
+        for key in solution:
+            _, piece_index, mask_index, (i, j) = labels[key]
+            mask = pentomino.pieces[piece_index].unique_rotations()[mask_index]
+            covered[i:i+mask.shape[0], j:j+mask.shape[1]] += mask
+
+        self.assertTrue(np.array_equal(covered, board.astype(int)))
+
+    def test_simplified_problems(self):
+        _, labels = pentomino.placements(pentomino.boards['hollow_chess_board'])
+        (base, _), _, (base_2, forced) = pentomino.simplified_chess_board_problems()
+
+        self.assertIsInstance(base_2, dance.SparseMatrix)
+        for key, label in enumerate(labels):
+            flipped_p = label[0] == 'P' and label[2] in [0, 2, 4, 6]
+            expected = [] if flipped_p else base.row(key).tolist()
+            self.assertEqual(base_2.row(key).tolist(), expected)
+
+class TestSymmetry(unittest.TestCase):
+    def test_board_symmetries(self):
+        self.assertEqual(len(pentomino.board_symmetries(pentomino.boards['hollow_chess_board'])), 8)
+        self.assertEqual(pentomino.board_symmetries(np.ones((3, 20), dtype=bool)),
+                         [(0, 0), (0, 1), (2, 0), (2, 1)])
+
+        board = np.ones((3, 20), dtype=bool)
+        board[0, 0] = False
+        self.assertEqual(pentomino.board_symmetries(board), [(0, 0)])
+
+    def test_placement_permutations(self):
+        board = pentomino.boards['hollow_chess_board']
+        mat, labels = pentomino.placements(board)
+        permutations = pentomino.placement_permutations(board, mat, pentomino.board_symmetries(board))
+
+        for perm in permutations:
+            self.assertEqual(sorted(perm), list(range(mat.shape[0])))
+            self.assertEqual([labels[k][1] for k in perm], [l[1] for l in labels])
+        self.assertEqual(permutations[0].tolist(), list(range(mat.shape[0])))
+
+    def test_reduced_solutions(self):
+        board = np.ones((3, 20), dtype=bool)
+        problem, permutations = pentomino.symmetry_reduced_problem(board, sparse=True)
+        self.assertEqual(len(permutations), 4)
+
+        reduced = dance.ArrayDancingLinks(problem).solve()
+        self.assertEqual(len(reduced), 2)
+
+        _, labels = pentomino.placements(board)
+        solutions = pentomino.expand_solutions(reduced, permutations)
+        self.assertEqual(len(solutions), 8)
+        for solution in solutions:
+            covered = np.zeros(board.shape, dtype=int)
+            for key in solution:
+                _, piece_index, mask_index, (i, j) = labels[key]
+                mask = pentomino.pieces[piece_index].unique_rotations()[mask_index]
+                covered[i:i+mask.shape[0], j:j+mask.shape[1]] += mask
+            self.assertTrue(np.all(covered == 1))
+
+    def test_asymmetric_board(self):
+        board = np.ones((8, 8), dtype=bool)
+        board[0, :4] = False
+        problem, permutations = pentomino.symmetry_reduced_problem(board, sparse=True)
+
+        self.assertEqual(len(permutations), 1)
+        self.assertEqual(problem.nnz, pentomino.exact_cover_problem(board, sparse=True).nnz)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import numpy as np
+import unittest
+
+import dance
+import sudoko
+
+class TestSudoko(unittest.TestCase):
+    board = np.array([[1, 0, 0, 0],
+                      [0, 0, 3, 0],
+                      [0, 4, 0, 0],
+                      [0, 0, 0, 2]])
+
+    def test_full_exact_cover_problem(self):
+        K = 4
+        mat = sudoko.full_exact_cover_problem(K)
+
+        self.assertEqual(mat.shape, (K**3, 4*K*K))
+        for i, (n, r, c) in enumerate(sudoko.exact_cover_labels(K)):
+            box = (r // 2) * 2 + c // 2
+            expected = [r*K + n-1, K*K + c*K + n-1, 2*K*K + box*K + n-1, 3*K*K + r*K + c]
+            self.assertEqual(list(np.nonzero(mat[i])[0]), expected)
+
+    def test_exact_cover_problem(self):
+        mat = sudoko.exact_cover_problem(self.board)
+        labels = sudoko.exact_cover_labels(4)
+
+        for i, (n, r, c) in enumerate(labels):
+            ruled_out = self.board[r, c] not in (0, n)
+            self.assertEqual(mat[i].any(), not ruled_out)
+
+    def test_exact_cover_problems(self):
+        boards = np.array([self.board, self.board.T, np.zeros((4, 4), dtype=int)])
+        problems = sudoko.exact_cover_problems(boards, sparse=True)
+
+        self.assertEqual(len(problems), 3)
+        for board, problem in zip(boards, problems):
+            self.assertTrue(np.array_equal(problem.toarray(),
+                                           sudoko.exact_cover_problem(board)))
+
+    def test_board_for_solution(self):
+        solution = dance.DancingLinks(sudoko.exact_cover_problem(self.board)).solve(1)[0]
+        board = sudoko.board_for_solution(solution, 4)
+
+        self.assertTrue(np.all(board[self.board > 0] == self.board[self.board > 0]))
+        for i in range(4):
+            self.assertEqual(sorted(board[i]), [1, 2, 3, 4])
+            self.assertEqual(sorted(board[:, i]), [1, 2, 3, 4])
+
+    def test_incorrect_shape(self):
+        self.assertRaises(ValueError, sudoko.exact_cover_problem, np.zeros((4, 3)))
+        self.assertRaises(ValueError, sudoko.full_exact_cover_problem, 5)
+
+    def test_clue_rows(self):
+        mat = sudoko.full_exact_cover_problem(4, sparse=True)
+        dl = dance.ArrayDancingLinks(mat, forced_rows=sudoko.clue_rows(self.board))
+        solutions = dl.solve(limit=2)
+
+        expected = dance.DancingLinks(sudoko.exact_cover_problem(self.board)).solve(2)
+        self.assertEqual([sorted(s) for s in solutions], [sorted(s) for s in expected])
+
+class TestSudokuSolver(unittest.TestCase):
+    def test_solve_many(self):
+        boards = [np.array([[1, 0, 0, 0],
+                            [0, 0, 3, 0],
+                            [0, 4, 0, 0],
+                            [0, 0, 0, 2]]),
+                  np.zeros((4, 4), dtype=int),
+                  np.array([[1, 1, 0, 0],
+                            [0, 0, 0, 0],
+                            [0, 0, 0, 0],
+                            [0, 0, 0, 0]]),
+                  np.array([[1, 2, 3, 4],
+                            [3, 4, 1, 2],
+                            [2, 1, 4, 3],
+                            [4, 3, 2, 0]])]
+
+        solver = sudoko.SudokuSolver(4)
+        results = list(solver.solve_many(boards))
+
+        self.assertEqual([unique for _, unique in results], [True, False, False, True])
+        self.assertIsNone(results[2][0])
+        self.assertEqual(results[3][0][3, 3], 1)
+        self.assertEqual(len(solver.solutions(boards[0], limit=None)),
+                         dance.DancingLinks(sudoko.exact_cover_problem(boards[0])).count_solutions())
+
+        # The structure is back to the full problem after every board
+        self.assertEqual(solver.dl.forced, [])
+        self.assertEqual([solver.dl.column_size(c) for c in solver.dl.columns], [4] * 64)
+
+    def test_incorrect_shape(self):
+        solver = sudoko.SudokuSolver(4)
+        self.assertRaises(ValueError, solver.solve, np.zeros((9, 9), dtype=int))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import numpy as np
+import random
+import unittest
+
+import dance
+import zdd
+
+def solution_set(solutions):
+    return sorted(tuple(sorted(s)) for s in solutions)
+
+class TestZDD(unittest.TestCase):
+    def setUp(self):
+        # Domino tilings of a 4 x 4 board
+        rows = []
+        for r in range(4):
+            for c in range(4):
+                if c < 3:
+                    rows.append([4 * r + c, 4 * r + c + 1])
+                if r < 3:
+                    rows.append([4 * r + c, 4 * r + c + 4])
+        self.dl = dance.ArrayDancingLinks(dance.SparseMatrix.from_rows(rows, 16))
+        self.expected = [s.tolist() for s in self.dl.solve()]
+        self.zdd = self.dl.build_zdd()
+
+    def test_solutions(self):
+        self.assertEqual(len(self.zdd), 36)
+        self.assertEqual(solution_set(self.zdd), solution_set(self.expected))
+        self.assertLess(self.zdd.size(), sum(len(s) for s in self.expected))
+
+    def test_random_problems(self):
+        rng = np.random.RandomState(9)
+        for engine in [dance.DancingLinks, dance.ArrayDancingLinks]:
+            for _ in range(10):
+                mat = rng.rand(25, 12) < 0.2
+                for n_secondary in [0, 3]:
+                    dl = engine(mat, n_secondary=n_secondary)
+                    expected = solution_set(dl.solve())
+                    diagram = dl.build_zdd(max_entries=5)
+                    self.assertEqual(diagram.count(), len(expected))
+                    self.assertEqual(solution_set(diagram), expected)
+
+    def test_shared_nodes(self):
+        table = zdd.NodeTable()
+        first = self.dl.build_zdd(table)
+        n_nodes = len(table)
+        second = self.dl.build_zdd(table)
+
+        self.assertEqual(first.root, second.root)
+        self.assertEqual(len(table), n_nodes)
+
+    def test_filters(self):
+        for row in range(24):
+            containing = [s for s in self.expected if row in s]
+            excluding = [s for s in self.expected if row not in s]
+            self.assertEqual(solution_set(self.zdd.containing(row)), solution_set(containing))
+            self.assertEqual(solution_set(self.zdd.excluding(row)), solution_set(excluding))
+            self.assertEqual(self.zdd.row_counts().get(row, 0), len(containing))
+
+        both = self.zdd.containing(0).containing(23)
+        self.assertEqual(len(both), sum(1 for s in self.expected if 0 in s and 23 in s))
+
+    def test_sample(self):
+        rng = random.Random(1)
+        expected = solution_set(self.expected)
+        samples = solution_set(self.zdd.sample(rng) for _ in range(1000))
+        self.assertEqual(sorted(set(samples)), expected)
+
+        self.assertEqual(self.zdd.containing(0).excluding(0).sample(rng), None)
+
+    def test_forced_rows(self):
+        forced = self.expected[0][0]
+        self.dl.force_rows([forced])
+        diagram = self.dl.build_zdd()
+        self.dl.release_rows()
+
+        solutions = [s.tolist() for s in diagram]
+        self.assertTrue(all(s[0] == forced for s in solutions))
+        self.assertEqual(solution_set(solutions),
+                         solution_set(s for s in self.expected if forced in s))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+"""Zero-suppressed decision diagrams of the solutions of exact cover problems
+
+A node stands for a family of sets of row keys: the sets of its lo child,
+and the sets of its hi child with its row key added.  The terminal EMPTY is
+the empty family and BASE the family holding only the empty set.  A node
+whose hi child is EMPTY is never made, its lo child stands for it.
+
+The diagrams built by DancingLinks.build_zdd are not ordered by row key,
+but a row key appears at most once on any path since the rows of a
+solution are distinct.  That is all the operations here rely on, and each
+of them takes time proportional to the number of nodes.
+"""
+
+import numpy as np
+import random
+
+EMPTY = 0
+BASE = 1
+
+class NodeTable(object):
+    """Nodes of any number of diagrams, identical nodes stored once
+
+    Node i has the row key key[i] and children lo[i] and hi[i], children
+    are always made before their parents.  unique maps (key, lo, hi) to the
+    node already made for it.
+    """
+    def __init__(self):
+        self.key = [None, None]
+        self.lo = [EMPTY, BASE]
+        self.hi = [EMPTY, BASE]
+        self.unique = {}
+
+    def node(self, key, lo, hi):
+        if hi == EMPTY:
+            return lo
+
+        triple = (key, lo, hi)
+        node = self.unique.get(triple)
+        if node is None:
+            node = len(self.key)
+            self.key.append(key)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.unique[triple] = node
+        return node
+
+    def __len__(self):
+        return len(self.key)
+
+class ZDD(object):
+    """The family of solutions below root, a node of table"""
+    def __init__(self, table, root):
+        self.table = table
+        self.root = root
+        self.counts = None
+
+    def nodes(self):
+        """Nodes reachable from the root, children before their parents"""
+        lo, hi = self.table.lo, self.table.hi
+
+        seen = set()
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node > BASE and node not in seen:
+                seen.add(node)
+                stack.append(lo[node])
+                stack.append(hi[node])
+        return sorted(seen)
+
+    def size(self):
+        """Number of nodes, not counting the terminals"""
+        return len(self.nodes())
+
+    def count_nodes(self):
+        """Number of sets below every reachable node"""
+        if self.counts is None:
+            lo, hi = self.table.lo, self.table.hi
+            counts = {EMPTY: 0, BASE: 1}
+            for node in self.nodes():
+                counts[node] = counts[lo[node]] + counts[hi[node]]
+            self.counts = counts
+        return self.counts
+
+    def count(self):
+        return self.count_nodes()[self.root]
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        """Generate the row keys of every solution, in the order of the
+        paths"""
+        key, lo, hi = self.table.key, self.table.lo, self.table.hi
+
+        stack = [(self.root, [])]
+        while stack:
+            node, keys = stack.pop()
+            while node > BASE:
+                stack.append((lo[node], keys))
+                keys = keys + [key[node]]
+                node = hi[node]
+            if node == BASE:
+                yield np.array(keys, dtype=int)
+
+    def sample(self, rng=None):
+        """Row keys of a solution chosen uniformly at random, or None if
+        there are none
+
+        rng is a random.Random, the module functions are used without one.
+        """
+        if rng is None:
+            rng = random
+        counts = self.count_nodes()
+        key, lo, hi = self.table.key, self.table.lo, self.table.hi
+
+        node = self.root
+        if counts[node] == 0:
+            return None
+
+        keys = []
+        while node > BASE:
+            if rng.randrange(counts[node]) < counts[hi[node]]:
+                keys.append(key[node])
+                node = hi[node]
+            else:
+                node = lo[node]
+        return np.array(keys, dtype=int)
+
+    def containing(self, row):
+        """The solutions containing the row with key row"""
+        table = self.table
+        key, lo, hi = table.key, table.lo, table.hi
+
+        # Sets below each node that contain the row, below the row itself
+        # every set is kept
+        needing = {EMPTY: EMPTY, BASE: EMPTY}
+        for node in self.nodes():
+            if key[node] == row:
+                needing[node] = table.node(row, needing[lo[node]], hi[node])
+            else:
+                needing[node] = table.node(key[node], needing[lo[node]], needing[hi[node]])
+        return ZDD(table, needing[self.root])
+
+    def excluding(self, row):
+        """The solutions without the row with key row"""
+        table = self.table
+        key, lo, hi = table.key, table.lo, table.hi
+
+        kept = {EMPTY: EMPTY, BASE: BASE}
+        for node in self.nodes():
+            if key[node] == row:
+                kept[node] = kept[lo[node]]
+            else:
+                kept[node] = table.node(key[node], kept[lo[node]], kept[hi[node]])
+        return ZDD(table, kept[self.root])
+
+    def row_counts(self):
+        """Number of solutions containing each row, as a dict by row key
+
+        The solutions through a node are the paths reaching it times the
+        sets below its hi child.
+        """
+        counts = self.count_nodes()
+        key, lo, hi = self.table.key, self.table.lo, self.table.hi
+
+        nodes = self.nodes()
+        paths = dict((node, 0) for node in nodes)
+        if nodes:
+            paths[self.root] = 1
+
+        rows = {}
+        for node in reversed(nodes):
+            for child in [lo[node], hi[node]]:
+                if child > BASE:
+                    paths[child] += paths[node]
+            rows[key[node]] = rows.get(key[node], 0) + paths[node] * counts[hi[node]]
+        return rows